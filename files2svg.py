@@ -11,16 +11,25 @@ Usage:
     python files2svg.py ./terraform/ output.svg --title "My Architecture"
 
 Requirements:
+    Python 3.10+
     pip install python-hcl2
 """
 
 import argparse
+import hashlib
+import io
+import os
+import pickle
 import re
 import sys
-from collections import defaultdict
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass, field
+from functools import lru_cache, partial
+from operator import attrgetter
 from pathlib import Path
-from typing import Dict, List, Optional, Set, Tuple
+from typing import Dict, List, Optional, Set, TextIO, Tuple
 
 try:
     import hcl2
@@ -44,6 +53,7 @@ MODULE_HDR = 32
 CANVAS_PAD = 64
 USER_W = 80
 ARROW_GAP = 8
+SAME_ROW_TOL = GRID * 2  # Max centre-y difference for a straight arrow
 
 COLORS = {
     "bg": "#ffffff",
@@ -60,6 +70,9 @@ COLORS = {
     "private_subnet": "#fff3e0",  # Light orange for private
 }
 
+# Tier container backgrounds (anything else uses module_bg)
+TIER_BG = {"public": COLORS["public_subnet"], "private": COLORS["private_subnet"]}
+
 # Resource categories for icon colors
 CATEGORY_COLORS = {
     "compute": "#ED7100",      # Orange - EC2, Lambda, ECS
@@ -211,12 +224,43 @@ PRIVATE_INDICATORS = {
     "aws_efs_file_system",
 }
 
+# Resource types used by the connection inference patterns
+LOAD_BALANCER_TYPES = {"aws_lb", "aws_alb", "aws_elb"}
+API_GATEWAY_TYPES = {"aws_api_gateway_rest_api", "aws_apigatewayv2_api"}
+
+# Map resource types to icon filename patterns (used with --icons)
+ICON_PATTERNS = {
+    "aws_instance": "Arch_Amazon-EC2_48",
+    "aws_lb": "Arch_Elastic-Load-Balancing_48",
+    "aws_alb": "Arch_Elastic-Load-Balancing_48",
+    "aws_db_instance": "Arch_Amazon-RDS_48",
+    "aws_rds_cluster": "Arch_Amazon-Aurora_48",
+    "aws_dynamodb_table": "Arch_Amazon-DynamoDB_48",
+    "aws_lambda_function": "Arch_AWS-Lambda_48",
+    "aws_lambda_function_url": "Arch_AWS-Lambda_48",
+    "aws_s3_bucket": "Arch_Amazon-Simple-Storage-Service_48",
+    "aws_cloudfront_distribution": "Arch_Amazon-CloudFront_48",
+    "aws_route53_zone": "Arch_Amazon-Route-53_48",
+    "aws_route53_record": "Arch_Amazon-Route-53_48",
+    "aws_api_gateway_rest_api": "Arch_Amazon-API-Gateway_48",
+    "aws_apigatewayv2_api": "Arch_Amazon-API-Gateway_48",
+    "aws_wafv2_web_acl": "Arch_AWS-WAF_48",
+    "aws_acm_certificate": "Arch_AWS-Certificate-Manager_48",
+    "aws_sqs_queue": "Arch_Amazon-Simple-Queue-Service_48",
+    "aws_sns_topic": "Arch_Amazon-Simple-Notification-Service_48",
+    "aws_ecs_cluster": "Arch_Amazon-Elastic-Container-Service_48",
+    "aws_ecs_service": "Arch_Amazon-Elastic-Container-Service_48",
+    "aws_eks_cluster": "Arch_Amazon-Elastic-Kubernetes-Service_48",
+    "aws_elasticache_cluster": "Arch_Amazon-ElastiCache_48",
+    "aws_efs_file_system": "Arch_Amazon-Elastic-File-System_48",
+}
+
 
 # =============================================================================
 # DATA STRUCTURES
 # =============================================================================
 
-@dataclass
+@dataclass(slots=True)
 class Resource:
     """Represents a Terraform resource."""
     id: str                           # e.g., "aws_instance.web"
@@ -234,9 +278,13 @@ class Resource:
     display_name: str = ""
     short_label: str = ""
     category: str = "compute"
+    color: str = field(init=False, repr=False, compare=False)  # From category
+    
+    def __post_init__(self):
+        self.color = CATEGORY_COLORS.get(self.category, "#888888")
 
 
-@dataclass
+@dataclass(slots=True)
 class Connection:
     """Represents a connection between resources."""
     from_id: str
@@ -244,31 +292,69 @@ class Connection:
     connection_type: str  # "security_group", "subnet", "explicit", "implicit"
 
 
-@dataclass 
+@dataclass(slots=True)
 class Position:
     x: int
     y: int
     w: int = NODE_W
     h: int = NODE_H
-    
-    @property
-    def cx(self) -> int: return self.x + self.w // 2
-    @property
-    def cy(self) -> int: return self.y + self.h // 2
-    @property
-    def right(self) -> int: return self.x + self.w
-    @property
-    def left(self) -> int: return self.x
+    # Derived edges/centre, computed once (positions are never moved)
+    cx: int = field(init=False, repr=False, compare=False)
+    cy: int = field(init=False, repr=False, compare=False)
+    right: int = field(init=False, repr=False, compare=False)
+    left: int = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self.cx = self.x + self.w // 2
+        self.cy = self.y + self.h // 2
+        self.right = self.x + self.w
+        self.left = self.x
 
 
 # =============================================================================
 # HCL PARSER
 # =============================================================================
 
-def parse_tf_files(tf_dir: Path) -> Tuple[Dict[str, Resource], Dict[str, dict], Dict[str, dict]]:
+# Directories never worth descending into (provider/module caches, VCS)
+SKIP_DIRS = {".terraform", ".git"}
+
+# Starting a process pool and shipping results back costs ~40-90 ms (41-file,
+# 94 KB tree that hcl2 parses serially in ~215 ms), so only hand trees at
+# least this large to one, and only with more than one CPU
+PARALLEL_MIN_BYTES = 256 * 1024
+
+# Opt-in (--cache) parsed-file cache. Entries are keyed on this script's
+# source and the hcl2 version as well as the file itself, so edited lookup
+# tables or an hcl2 upgrade never serve stale resources.
+CACHE_DIR = Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "files2svg"
+CACHE_MAX_ENTRIES = 2048
+
+
+def _iter_tf_files(root: Path):
+    """Yield .tf file paths under root (same order as rglob, minus SKIP_DIRS)."""
+    stack = [str(root)]
+    while stack:
+        d = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            subdirs.append(entry.path)
+                    elif entry.name.endswith(".tf"):
+                        yield entry.path
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+
+
+def parse_tf_files(tf_dir: Path, use_cache: bool = False) -> Tuple[Dict[str, Resource], Dict[str, dict], Dict[str, dict]]:
     """
     Parse all .tf files in directory.
     
+    With use_cache, per-file results are read from and written to CACHE_DIR.
+    
     Returns:
         resources: Dict of resource_id -> Resource
         security_groups: Dict of sg_id -> {ingress, egress rules}
@@ -278,117 +364,281 @@ def parse_tf_files(tf_dir: Path) -> Tuple[Dict[str, Resource], Dict[str, dict],
     security_groups = {}
     subnets = {}
     
-    tf_files = list(tf_dir.rglob("*.tf"))
+    # Refs are only shared within one parse; don't carry them across runs
+    _extract_ref_str.cache_clear()
+    
+    tf_files = list(_iter_tf_files(tf_dir))
     if not tf_files:
         print(f"Warning: No .tf files found in {tf_dir}", file=sys.stderr)
         return resources, security_groups, subnets
     
-    for tf_file in tf_files:
+    if use_cache and not _cache_dir_ready():
+        print(f"Warning: {CACHE_DIR} is not private to this user, not caching", file=sys.stderr)
+        use_cache = False
+    parse = partial(_parse_one, use_cache=use_cache)
+    
+    results = None
+    workers = min(len(tf_files), os.cpu_count() or 1)
+    if workers > 1 and sum(map(os.path.getsize, tf_files)) >= PARALLEL_MIN_BYTES:
+        # hcl2 is CPU-bound pure Python; spread files across processes
         try:
-            with open(tf_file, 'r') as f:
-                parsed = hcl2.load(f)
-        except Exception as e:
-            print(f"Warning: Could not parse {tf_file}: {e}", file=sys.stderr)
-            continue
-        
-        # Process resources
-        for resource_block in parsed.get("resource", []):
-            for resource_type, instances in resource_block.items():
-                # instances is {name: attrs} dict
-                if isinstance(instances, dict):
-                    for name, attrs in instances.items():
-                        if not isinstance(attrs, dict):
-                            continue
-                        
-                        resource_id = f"{resource_type}.{name}"
-                        
-                        # Create resource object
-                        info = RESOURCE_INFO.get(resource_type, (resource_type, resource_type[:3].upper(), "compute", False))
-                        resource = Resource(
-                            id=resource_id,
-                            resource_type=resource_type,
-                            name=name,
-                            attributes=attrs,
-                            display_name=info[0],
-                            short_label=info[1],
-                            category=info[2],
-                        )
-                        
-                        # Extract placement info
-                        resource.subnet_ref = extract_ref(attrs.get("subnet_id"))
-                        resource.vpc_ref = extract_ref(attrs.get("vpc_id"))
-                        
-                        # Security groups
-                        sg_ids = attrs.get("vpc_security_group_ids", attrs.get("security_groups", []))
-                        if isinstance(sg_ids, list):
-                            resource.security_groups = [extract_ref(sg) for sg in sg_ids if extract_ref(sg)]
-                        
-                        # Determine tier based on resource type
-                        if resource_type in PUBLIC_INDICATORS:
-                            resource.tier = "public"
-                        elif resource_type in PRIVATE_INDICATORS:
-                            resource.tier = "private"
-                        else:
-                            # Check if subnet name hints at public/private
-                            subnet_ref = resource.subnet_ref or ""
-                            if "public" in subnet_ref.lower():
-                                resource.tier = "public"
-                            elif "private" in subnet_ref.lower():
-                                resource.tier = "private"
-                        
-                        resources[resource_id] = resource
-                        
-                        # Track security groups
-                        if resource_type == "aws_security_group":
-                            security_groups[resource_id] = {
-                                "ingress": attrs.get("ingress", []),
-                                "egress": attrs.get("egress", []),
-                                "name": attrs.get("name", name),
-                            }
+            with ProcessPoolExecutor(max_workers=workers) as ex:
+                results = list(ex.map(parse, tf_files, chunksize=8))
+        except (OSError, NotImplementedError, BrokenProcessPool):
+            # No working multiprocessing here (e.g. no sem_open); parse inline
+            results = None
+    if results is None:
+        results = map(parse, tf_files)
+    
+    wrote = False
+    for (file_resources, file_sgs, file_subnets), written in results:
+        wrote |= written
+        # Intern types so lookups in the type tables (whose literal keys are
+        # already interned) hit the identity fast path. Done here because
+        # strings coming back from workers/the cache are fresh copies.
+        for res in file_resources.values():
+            res.resource_type = sys.intern(res.resource_type)
+        resources.update(file_resources)
+        security_groups.update(file_sgs)
+        subnets.update(file_subnets)
+    
+    # Only new entries can push the cache past its limit
+    if wrote:
+        _prune_cache()
+    
+    return resources, security_groups, subnets
+
+
+def _parse_one(tf_file: str, use_cache: bool = False) -> Tuple[Tuple[Dict[str, Resource], Dict[str, dict], Dict[str, dict]], bool]:
+    """Parse a single .tf file (runs in a worker process for large trees).
+    
+    Returns the parsed data and whether a new cache entry was written.
+    """
+    cache_file = _cache_path(tf_file) if use_cache else None
+    cached = _read_cache(cache_file)
+    if cached is not None:
+        return cached, False
+    
+    result = _parse_file(tf_file)
+    if result is None:
+        return ({}, {}, {}), False
+    return result, _write_cache(cache_file, result)
+
+
+def _parse_file(tf_file: str) -> Optional[Tuple[Dict[str, Resource], Dict[str, dict], Dict[str, dict]]]:
+    """Run hcl2 on one file and extract resources, security groups and subnets."""
+    resources = {}
+    security_groups = {}
+    subnets = {}
+    
+    try:
+        # Terraform files are UTF-8; read in one go and hand the text to hcl2
+        with open(tf_file, 'r', encoding='utf-8', buffering=1 << 20) as f:
+            parsed = hcl2.loads(f.read())
+    except Exception as e:
+        print(f"Warning: Could not parse {tf_file}: {e}", file=sys.stderr)
+        return None
+    
+    # Process resources
+    for resource_block in parsed.get("resource", []):
+        for resource_type, instances in resource_block.items():
+            # instances is {name: attrs} dict
+            if isinstance(instances, dict):
+                for name, attrs in instances.items():
+                    if not isinstance(attrs, dict):
+                        continue
+                    
+                    resource_id = f"{resource_type}.{name}"
+                    
+                    # Create resource object
+                    info = RESOURCE_INFO.get(resource_type, (resource_type, resource_type[:3].upper(), "compute", False))
+                    resource = Resource(
+                        id=resource_id,
+                        resource_type=resource_type,
+                        name=name,
+                        attributes=attrs,
+                        display_name=info[0],
+                        short_label=info[1],
+                        category=info[2],
+                    )
+                    
+                    # Extract placement info
+                    resource.subnet_ref = extract_ref(attrs.get("subnet_id"))
+                    resource.vpc_ref = extract_ref(attrs.get("vpc_id"))
+                    
+                    # Security groups
+                    sg_ids = attrs.get("vpc_security_group_ids")
+                    if sg_ids is None:
+                        sg_ids = attrs.get("security_groups")
+                    if isinstance(sg_ids, list):
+                        resource.security_groups = [ref for sg in sg_ids if (ref := extract_ref(sg))]
+                    
+                    # Determine tier based on resource type
+                    if resource_type in PUBLIC_INDICATORS:
+                        resource.tier = "public"
+                    elif resource_type in PRIVATE_INDICATORS:
+                        resource.tier = "private"
+                    else:
+                        # Check if subnet name hints at public/private
+                        tier = _tier_hint(resource.subnet_ref or "")
+                        if tier:
+                            resource.tier = tier
+                    
+                    resources[resource_id] = resource
+                    
+                    # Track security groups
+                    if resource_type == "aws_security_group":
+                        # Rules are always stored as lists
+                        ingress = attrs.get("ingress", [])
+                        if not isinstance(ingress, list):
+                            ingress = [ingress]
+                        egress = attrs.get("egress", [])
+                        if not isinstance(egress, list):
+                            egress = [egress]
+                        security_groups[resource_id] = {
+                            "ingress": ingress,
+                            "egress": egress,
+                            "name": attrs.get("name", name),
+                        }
+                    
+                    # Track subnets
+                    if resource_type == "aws_subnet":
+                        is_public = attrs.get("map_public_ip_on_launch", False)
+                        if not is_public:
+                            # Check name for hints
+                            subnet_name = attrs.get("tags", {}).get("Name", name)
+                            is_public = _tier_hint(str(subnet_name)) == "public"
                         
-                        # Track subnets
-                        if resource_type == "aws_subnet":
-                            is_public = attrs.get("map_public_ip_on_launch", False)
-                            if not is_public:
-                                # Check name for hints
-                                subnet_name = attrs.get("tags", {}).get("Name", name)
-                                is_public = "public" in str(subnet_name).lower()
-                            
-                            subnets[resource_id] = {
-                                "cidr": attrs.get("cidr_block"),
-                                "public": is_public,
-                                "vpc_ref": extract_ref(attrs.get("vpc_id")),
-                                "name": name,
-                            }
+                        subnets[resource_id] = {
+                            "cidr": attrs.get("cidr_block"),
+                            "public": is_public,
+                            "vpc_ref": extract_ref(attrs.get("vpc_id")),
+                            "name": name,
+                        }
     
     return resources, security_groups, subnets
 
 
+@lru_cache(maxsize=None)
+def _cache_salt() -> str:
+    """Digest of this script's source and the hcl2 version."""
+    h = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=16)
+    h.update(getattr(hcl2, "__version__", "").encode())
+    return h.hexdigest()
+
+
+def _cache_dir_ready() -> bool:
+    """Create CACHE_DIR for this user only; refuse one that others can write to."""
+    try:
+        CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        st = CACHE_DIR.stat()
+    except OSError:
+        return False
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        return False
+    return not st.st_mode & 0o022
+
+
+def _cache_path(tf_file: str) -> Optional[Path]:
+    """Cache entry for a file, keyed by its absolute path, mtime and size."""
+    try:
+        st = os.stat(tf_file)
+    except OSError:
+        return None
+    key = f"{_cache_salt()}:{os.path.abspath(tf_file)}:{st.st_mtime_ns}:{st.st_size}"
+    digest = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return CACHE_DIR / f"{digest}.pkl"
+
+
+def _read_cache(cache_file: Optional[Path]):
+    if cache_file is None:
+        return None
+    try:
+        with open(cache_file, 'rb') as f:
+            result = pickle.load(f)
+        os.utime(cache_file)  # Mark as recently used for pruning
+        return result
+    except Exception:
+        return None
+
+
+def _write_cache(cache_file: Optional[Path], result) -> bool:
+    if cache_file is None:
+        return False
+    try:
+        with tempfile.NamedTemporaryFile(dir=cache_file.parent, suffix=".tmp", delete=False) as tmp:
+            pickle.dump(result, tmp, protocol=5)
+        os.replace(tmp.name, cache_file)
+        return True
+    except Exception:
+        return False
+
+
+def _prune_cache() -> None:
+    """Drop least recently used entries once the cache grows past CACHE_MAX_ENTRIES."""
+    try:
+        entries = [(e.stat().st_mtime_ns, e.path) for e in os.scandir(CACHE_DIR) if e.name.endswith(".pkl")]
+    except OSError:
+        return
+    if len(entries) <= CACHE_MAX_ENTRIES:
+        return
+    entries.sort()
+    for _, path in entries[:len(entries) - CACHE_MAX_ENTRIES]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+# Reference patterns (compiled once, extract_ref runs for every attribute)
+REF_INTERP_RE = re.compile(r'\$\{([^}]+)\}')
+REF_SUFFIX_RE = re.compile(r'\.(id|arn|name)$')
+
+
 def extract_ref(value) -> Optional[str]:
     """Extract resource reference from HCL value."""
-    if value is None:
-        return None
+    # hcl2 wraps most refs in single-element lists; unwrap in place
+    while isinstance(value, list):
+        if len(value) != 1:
+            return None
+        value = value[0]
     
     if isinstance(value, str):
-        # Handle "${aws_subnet.public.id}" format
-        match = re.search(r'\$\{([^}]+)\}', value)
-        if match:
-            ref = match.group(1)
-            # Remove .id, .arn suffixes
-            ref = re.sub(r'\.(id|arn|name)$', '', ref)
-            return ref
-        
-        # Handle "aws_subnet.public.id" format (HCL2)
-        if value.startswith("aws_"):
-            ref = re.sub(r'\.(id|arn|name)$', '', value)
-            return ref
+        return _extract_ref_str(value)
     
-    elif isinstance(value, list) and len(value) == 1:
-        return extract_ref(value[0])
+    return None
+
+
+@lru_cache(maxsize=4096)
+def _extract_ref_str(value: str) -> Optional[str]:
+    """Extract resource reference from an HCL string (cached, refs repeat a lot)."""
+    # Handle "${aws_subnet.public.id}" format
+    match = REF_INTERP_RE.search(value) if '${' in value else None
+    if match:
+        ref = match.group(1)
+        # Remove .id, .arn suffixes
+        ref = REF_SUFFIX_RE.sub('', ref)
+        return ref
+    
+    # Handle "aws_subnet.public.id" format (HCL2)
+    if value.startswith("aws_"):
+        ref = REF_SUFFIX_RE.sub('', value)
+        return ref
     
     return None
 
 
+@lru_cache(maxsize=1024)
+def _tier_hint(name: str) -> Optional[str]:
+    """Tier suggested by a subnet name/ref ("public" wins over "private")."""
+    lowered = name.lower()
+    if "public" in lowered:
+        return "public"
+    if "private" in lowered:
+        return "private"
+    return None
+
+
 # =============================================================================
 # CONNECTION INFERENCE
 # =============================================================================
@@ -402,23 +652,31 @@ def infer_connections(
     1. Security group rules (who can talk to whom)
     2. Explicit references in attributes
     3. Architectural patterns (ALB → EC2 → RDS)
+    
+    Only resources that get drawn (not in SKIP_RESOURCES) are connected.
     """
     connections = []
+    # Edges are deduplicated on packed int keys (from_idx * n + to_idx)
+    index = {res_id: i for i, res_id in enumerate(resources)}
+    n = len(index)
     seen = set()
     
-    # Build reverse lookup: sg_id -> resources using it
-    sg_to_resources: Dict[str, List[str]] = defaultdict(list)
+    # Build reverse lookup: sg_id -> visible resources using it
+    sg_to_resources: Dict[str, List[str]] = {}
     for res_id, res in resources.items():
+        if res.resource_type in SKIP_RESOURCES:
+            continue
         for sg in res.security_groups:
-            sg_to_resources[sg].append(res_id)
+            sg_to_resources.setdefault(sg, []).append(res_id)
     
     # 1. Security group based connections
     for sg_id, sg_info in security_groups.items():
-        ingress_rules = sg_info.get("ingress", [])
-        if not isinstance(ingress_rules, list):
-            ingress_rules = [ingress_rules]
+        # Nothing uses this group, so no rule on it can produce an edge
+        targets = sg_to_resources.get(sg_id)
+        if not targets:
+            continue
         
-        for rule in ingress_rules:
+        for rule in sg_info.get("ingress", ()):
             if not isinstance(rule, dict):
                 continue
             
@@ -426,51 +684,65 @@ def infer_connections(
             source_sgs = rule.get("security_groups", [])
             if isinstance(source_sgs, list):
                 for source_sg in source_sgs:
-                    source_ref = extract_ref(source_sg)
-                    if source_ref and source_ref in sg_to_resources:
-                        # Resources in source_sg can connect to resources in sg_id
-                        for from_res in sg_to_resources.get(source_ref, []):
-                            for to_res in sg_to_resources.get(sg_id, []):
-                                if from_res != to_res:
-                                    key = (from_res, to_res)
-                                    if key not in seen:
-                                        seen.add(key)
-                                        connections.append(Connection(from_res, to_res, "security_group"))
+                    sources = sg_to_resources.get(extract_ref(source_sg))
+                    if not sources:
+                        continue
+                    # Resources in source_sg can connect to resources in sg_id
+                    for from_res in sources:
+                        for to_res in targets:
+                            if from_res != to_res:
+                                key = index[from_res] * n + index[to_res]
+                                if key not in seen:
+                                    seen.add(key)
+                                    connections.append(Connection(from_res, to_res, "security_group"))
     
     # 2. Infer from architectural patterns
-    public_resources = [r for r in resources.values() if r.tier == "public" and r.resource_type not in SKIP_RESOURCES]
-    private_resources = [r for r in resources.values() if r.tier == "private" and r.resource_type not in SKIP_RESOURCES]
-    compute_resources = [r for r in resources.values() if r.category == "compute" and r.resource_type not in SKIP_RESOURCES]
-    
-    # Pattern: Load Balancer → Compute
+    # Bucket visible resources once instead of rescanning per pattern
+    load_balancers = []
+    api_gateways = []
+    lb_targets = []      # Compute in public/unknown tier
+    lambdas = []
+    compute_resources = []
+    databases = []       # Private-tier databases
     for res in resources.values():
-        if res.resource_type in {"aws_lb", "aws_alb", "aws_elb"}:
-            # Find compute resources (EC2, ECS, Lambda)
-            for compute in compute_resources:
-                if compute.tier in {"public", "unknown"}:  # LB typically routes to public/compute tier
-                    key = (res.id, compute.id)
-                    if key not in seen:
-                        seen.add(key)
-                        connections.append(Connection(res.id, compute.id, "implicit"))
+        if res.resource_type in SKIP_RESOURCES:
+            continue
+        if res.resource_type in LOAD_BALANCER_TYPES:
+            load_balancers.append(res)
+        elif res.resource_type in API_GATEWAY_TYPES:
+            api_gateways.append(res)
+        if res.category == "compute":
+            compute_resources.append(res)
+            if res.tier in ("public", "unknown"):  # LB typically routes to public/compute tier
+                lb_targets.append(res)
+            if res.resource_type == "aws_lambda_function":
+                lambdas.append(res)
+        elif res.category == "database" and res.tier == "private":
+            databases.append(res)
+    
+    # Pattern: Load Balancer → Compute (EC2, ECS, Lambda)
+    for res in load_balancers:
+        for compute in lb_targets:
+            key = index[res.id] * n + index[compute.id]
+            if key not in seen:
+                seen.add(key)
+                connections.append(Connection(res.id, compute.id, "implicit"))
     
     # Pattern: Compute → Database
     for compute in compute_resources:
-        for db in private_resources:
-            if db.category == "database":
-                key = (compute.id, db.id)
-                if key not in seen:
-                    seen.add(key)
-                    connections.append(Connection(compute.id, db.id, "implicit"))
+        for db in databases:
+            key = index[compute.id] * n + index[db.id]
+            if key not in seen:
+                seen.add(key)
+                connections.append(Connection(compute.id, db.id, "implicit"))
     
     # Pattern: API Gateway → Lambda
-    for res in resources.values():
-        if res.resource_type in {"aws_api_gateway_rest_api", "aws_apigatewayv2_api"}:
-            for compute in compute_resources:
-                if compute.resource_type == "aws_lambda_function":
-                    key = (res.id, compute.id)
-                    if key not in seen:
-                        seen.add(key)
-                        connections.append(Connection(res.id, compute.id, "implicit"))
+    for res in api_gateways:
+        for compute in lambdas:
+            key = index[res.id] * n + index[compute.id]
+            if key not in seen:
+                seen.add(key)
+                connections.append(Connection(res.id, compute.id, "implicit"))
     
     return connections
 
@@ -495,8 +767,15 @@ def layout_resources(
     if not visible:
         return {"positions": {}, "tiers": {}, "vpc": None, "width": 400, "height": 300, "is_serverless": True}
     
-    # Detect if this is a VPC-based or serverless architecture
-    has_vpc_resources = any(r.resource_type in VPC_RESOURCES for r in visible.values())
+    # Detect if this is a VPC-based or serverless architecture, and note the
+    # first resource of each tier (the user arrow points at the public one)
+    has_vpc_resources = False
+    entry_points: Dict[str, str] = {}
+    for res in visible.values():
+        if res.resource_type in VPC_RESOURCES:
+            has_vpc_resources = True
+        if res.tier not in entry_points:
+            entry_points[res.tier] = res.id
     
     positions = {}
     tier_bounds = {}
@@ -504,14 +783,15 @@ def layout_resources(
     
     if has_vpc_resources and group_by_tier:
         # VPC-based architecture - group by public/private subnet
-        by_tier = defaultdict(list)
-        for res in visible.values():
+        # Sort once up front; bucketing keeps each tier in (category, name) order
+        by_tier: Dict[str, List[Resource]] = {}
+        for res in sorted(visible.values(), key=attrgetter("category", "name")):
             # Only VPC resources go in tiers
             if res.resource_type in VPC_RESOURCES:
-                by_tier[res.tier].append(res)
+                by_tier.setdefault(res.tier, []).append(res)
             else:
                 # Serverless resources in a VPC architecture go in "external" tier
-                by_tier["external"].append(res)
+                by_tier.setdefault("external", []).append(res)
         
         # Order: external (edge services), public, private
         tier_order = ["external", "public", "private"]
@@ -539,8 +819,6 @@ def layout_resources(
             if not tier_resources:
                 continue
             
-            tier_resources.sort(key=lambda r: (r.category, r.name))
-            
             tier_w = max_tier_w
             tier_h = NODE_H + MODULE_PAD * 2 + MODULE_HDR
             tier_x = CANVAS_PAD + USER_W + VPC_PAD if tier_name != "external" else CANVAS_PAD + USER_W
@@ -607,22 +885,20 @@ def layout_resources(
         
         # Single row or wrap to multiple rows
         MAX_PER_ROW = 6
-        rows = [all_resources[i:i+MAX_PER_ROW] for i in range(0, len(all_resources), MAX_PER_ROW)]
+        x0 = CANVAS_PAD + USER_W + H_GAP
+        y0 = CANVAS_PAD + 6 * GRID
         
-        y = CANVAS_PAD + 6 * GRID
-        max_w = 0
+        for i, res in enumerate(all_resources):
+            row, col = divmod(i, MAX_PER_ROW)
+            positions[res.id] = Position(x=x0 + col * (NODE_W + H_GAP), y=y0 + row * (NODE_H + V_GAP * 2))
         
-        for row in rows:
-            x = CANVAS_PAD + USER_W + H_GAP
-            for res in row:
-                positions[res.id] = Position(x=x, y=y)
-                x += NODE_W + H_GAP
-            max_w = max(max_w, x)
-            y += NODE_H + V_GAP * 2
+        num_rows = -(-len(all_resources) // MAX_PER_ROW)
+        max_w = x0 + min(MAX_PER_ROW, len(all_resources)) * (NODE_W + H_GAP)
+        y = y0 + num_rows * (NODE_H + V_GAP * 2)
     
     # Calculate user position
     if positions:
-        first_pos = list(positions.values())[0]
+        first_pos = next(iter(positions.values()))
         user_y = first_pos.y
     else:
         user_y = CANVAS_PAD + 100
@@ -632,6 +908,7 @@ def layout_resources(
         "tiers": tier_bounds,
         "vpc": vpc_bounds,
         "user": Position(x=CANVAS_PAD, y=user_y, w=48, h=60),
+        "entry_points": entry_points,
         "width": max_w + CANVAS_PAD,
         "height": y + CANVAS_PAD,
         "is_serverless": not has_vpc_resources,
@@ -641,143 +918,151 @@ def layout_resources(
 # =============================================================================
 # SVG GENERATION
 # =============================================================================
+# Every svg_* helper writes its element(s) straight into `out` (one element
+# per line) instead of returning a string for generate_svg to join.
 
-def svg_defs() -> str:
-    return f'''  <defs>
-    <marker id="arrow" markerWidth="8" markerHeight="6" refX="7" refY="3" orient="auto">
-      <path d="M0,0 L0,6 L8,3 z" fill="{COLORS['arrow']}"/>
-    </marker>
-    <filter id="shadow" x="-20%" y="-20%" width="140%" height="140%">
-      <feDropShadow dx="0" dy="2" stdDeviation="3" flood-opacity="0.1"/>
-    </filter>
-  </defs>'''
+def svg_defs(out: TextIO) -> None:
+    write = out.write
+    write('  <defs>\n')
+    write('    <marker id="arrow" markerWidth="8" markerHeight="6" refX="7" refY="3" orient="auto">\n')
+    write(f'      <path d="M0,0 L0,6 L8,3 z" fill="{COLORS["arrow"]}"/>\n')
+    write('    </marker>\n')
+    write('    <filter id="shadow" x="-20%" y="-20%" width="140%" height="140%">\n')
+    write('      <feDropShadow dx="0" dy="2" stdDeviation="3" flood-opacity="0.1"/>\n')
+    write('    </filter>\n')
+    write('  </defs>\n')
 
 
-def svg_vpc(bounds: dict) -> str:
+def svg_vpc(out: TextIO, bounds: dict) -> None:
     """Render VPC container."""
     x, y, w, h = bounds["x"], bounds["y"], bounds["w"], bounds["h"]
     label = bounds.get("label", "VPC")
     
-    return f'''  <g class="vpc">
-    <rect x="{x}" y="{y}" width="{w}" height="{h}" fill="#fafafa" stroke="#232f3e" stroke-width="2" rx="8" stroke-dasharray="8,4"/>
-    <rect x="{x}" y="{y}" width="{w}" height="{MODULE_HDR}" fill="#232f3e" rx="8"/>
-    <rect x="{x}" y="{y + MODULE_HDR - 8}" width="{w}" height="8" fill="#232f3e"/>
-    <text x="{x + 16}" y="{y + 21}" font-size="13" font-weight="600" fill="#ffffff">{label}</text>
-  </g>'''
+    write = out.write
+    write('  <g class="vpc">\n')
+    write(f'    <rect x="{x}" y="{y}" width="{w}" height="{h}" fill="#fafafa" stroke="#232f3e" stroke-width="2" rx="8" stroke-dasharray="8,4"/>\n')
+    write(f'    <rect x="{x}" y="{y}" width="{w}" height="{MODULE_HDR}" fill="#232f3e" rx="8"/>\n')
+    write(f'    <rect x="{x}" y="{y + MODULE_HDR - 8}" width="{w}" height="8" fill="#232f3e"/>\n')
+    write(f'    <text x="{x + 16}" y="{y + 21}" font-size="13" font-weight="600" fill="#ffffff">{label}</text>\n')
+    write('  </g>\n')
 
 
-def svg_tier(name: str, bounds: dict) -> str:
+def svg_tier(out: TextIO, name: str, bounds: dict) -> None:
     """Render a tier container (Public/Private)."""
     x, y, w, h = bounds["x"], bounds["y"], bounds["w"], bounds["h"]
     label = bounds.get("label", name)
     
     # Use different background colors for public vs private
-    if "public" in name.lower():
-        bg_color = COLORS["public_subnet"]
-    elif "private" in name.lower():
-        bg_color = COLORS["private_subnet"]
-    else:
-        bg_color = COLORS["module_bg"]
-    
-    return f'''  <g class="tier">
-    <rect x="{x}" y="{y}" width="{w}" height="{h}" fill="{bg_color}" stroke="{COLORS['module_border']}" rx="8"/>
-    <rect x="{x}" y="{y}" width="{w}" height="{MODULE_HDR}" fill="{COLORS['module_header']}" rx="8"/>
-    <rect x="{x}" y="{y + MODULE_HDR - 8}" width="{w}" height="8" fill="{COLORS['module_header']}"/>
-    <text x="{x + 16}" y="{y + 21}" font-size="13" font-weight="600" fill="#ffffff">{label}</text>
-  </g>'''
+    bg_color = TIER_BG.get(_tier_hint(name), COLORS["module_bg"])
+    
+    write = out.write
+    write('  <g class="tier">\n')
+    write(f'    <rect x="{x}" y="{y}" width="{w}" height="{h}" fill="{bg_color}" stroke="{COLORS["module_border"]}" rx="8"/>\n')
+    write(f'    <rect x="{x}" y="{y}" width="{w}" height="{MODULE_HDR}" fill="{COLORS["module_header"]}" rx="8"/>\n')
+    write(f'    <rect x="{x}" y="{y + MODULE_HDR - 8}" width="{w}" height="8" fill="{COLORS["module_header"]}"/>\n')
+    write(f'    <text x="{x + 16}" y="{y + 21}" font-size="13" font-weight="600" fill="#ffffff">{label}</text>\n')
+    write('  </g>\n')
 
 
-def svg_node(resource: Resource, pos: Position, icons_dir: Optional[Path] = None) -> str:
+def svg_node(out: TextIO, resource: Resource, pos: Position, icons_dir: Optional[Path] = None) -> None:
     """Render a resource node with optional external icon."""
-    color = CATEGORY_COLORS.get(resource.category, "#888888")
+    color = resource.color
+    
+    x, y, cx = pos.x, pos.y, pos.cx
     
     # Icon area
-    icon_x = pos.x + (pos.w - 48) // 2
-    icon_y = pos.y + 12
+    icon_x = x + (pos.w - 48) // 2
+    icon_y = y + 12
     
     # Try to load external icon
     icon_svg = None
     if icons_dir:
         icon_svg = load_icon(resource.resource_type, icons_dir)
     
+    write = out.write
+    write(f'  <g class="node">\n    <rect x="{x}" y="{y}" width="{pos.w}" height="{pos.h}" fill="{COLORS["node_bg"]}" stroke="{COLORS["node_border"]}" rx="6" filter="url(#shadow)"/>\n')
+    
     if icon_svg:
         # Use external icon
-        icon_content = f'''    <g transform="translate({icon_x},{icon_y}) scale(0.75)">
-{icon_svg}
-    </g>'''
+        write(f'    <g transform="translate({icon_x},{icon_y}) scale(0.75)">\n{icon_svg}\n    </g>\n')
     else:
         # Fallback to colored box with label
-        icon_content = f'''    <rect x="{icon_x}" y="{icon_y}" width="48" height="48" rx="6" fill="{color}"/>
-    <text x="{pos.cx}" y="{icon_y + 32}" font-size="14" font-weight="600" fill="white" text-anchor="middle">{resource.short_label}</text>'''
+        write(f'    <rect x="{icon_x}" y="{icon_y}" width="48" height="48" rx="6" fill="{color}"/>\n'
+              f'    <text x="{cx}" y="{icon_y + 32}" font-size="14" font-weight="600" fill="white" text-anchor="middle">{resource.short_label}</text>\n')
     
-    return f'''  <g class="node">
-    <rect x="{pos.x}" y="{pos.y}" width="{pos.w}" height="{pos.h}" fill="{COLORS['node_bg']}" stroke="{COLORS['node_border']}" rx="6" filter="url(#shadow)"/>
-{icon_content}
-    <text x="{pos.cx}" y="{pos.y + 76}" font-size="9" fill="{COLORS['text_secondary']}" text-anchor="middle">{resource.display_name}</text>
-    <text x="{pos.cx}" y="{pos.y + 90}" font-size="11" fill="{COLORS['text']}" text-anchor="middle">{resource.name}</text>
-  </g>'''
+    write(f'    <text x="{cx}" y="{y + 76}" font-size="9" fill="{COLORS["text_secondary"]}" text-anchor="middle">{resource.display_name}</text>\n'
+          f'    <text x="{cx}" y="{y + 90}" font-size="11" fill="{COLORS["text"]}" text-anchor="middle">{resource.name}</text>\n'
+          '  </g>\n')
 
 
 def load_icon(resource_type: str, icons_dir: Path) -> Optional[str]:
     """Load SVG icon from icons directory (searches recursively)."""
-    # Map resource types to icon filename patterns
-    ICON_PATTERNS = {
-        "aws_instance": "Arch_Amazon-EC2_48",
-        "aws_lb": "Arch_Elastic-Load-Balancing_48",
-        "aws_alb": "Arch_Elastic-Load-Balancing_48",
-        "aws_db_instance": "Arch_Amazon-RDS_48",
-        "aws_rds_cluster": "Arch_Amazon-Aurora_48",
-        "aws_dynamodb_table": "Arch_Amazon-DynamoDB_48",
-        "aws_lambda_function": "Arch_AWS-Lambda_48",
-        "aws_lambda_function_url": "Arch_AWS-Lambda_48",
-        "aws_s3_bucket": "Arch_Amazon-Simple-Storage-Service_48",
-        "aws_cloudfront_distribution": "Arch_Amazon-CloudFront_48",
-        "aws_route53_zone": "Arch_Amazon-Route-53_48",
-        "aws_route53_record": "Arch_Amazon-Route-53_48",
-        "aws_api_gateway_rest_api": "Arch_Amazon-API-Gateway_48",
-        "aws_apigatewayv2_api": "Arch_Amazon-API-Gateway_48",
-        "aws_wafv2_web_acl": "Arch_AWS-WAF_48",
-        "aws_acm_certificate": "Arch_AWS-Certificate-Manager_48",
-        "aws_sqs_queue": "Arch_Amazon-Simple-Queue-Service_48",
-        "aws_sns_topic": "Arch_Amazon-Simple-Notification-Service_48",
-        "aws_ecs_cluster": "Arch_Amazon-Elastic-Container-Service_48",
-        "aws_ecs_service": "Arch_Amazon-Elastic-Container-Service_48",
-        "aws_eks_cluster": "Arch_Amazon-Elastic-Kubernetes-Service_48",
-        "aws_elasticache_cluster": "Arch_Amazon-ElastiCache_48",
-        "aws_efs_file_system": "Arch_Amazon-Elastic-File-System_48",
-    }
-    
     pattern = ICON_PATTERNS.get(resource_type)
     if not pattern:
         return None
-    
-    # Search recursively for the icon file
-    for svg_file in icons_dir.rglob(f"{pattern}.svg"):
+    return _load_icon(pattern, str(icons_dir))
+
+
+# graph2svg._icon_index is the same walker; keep the two in step
+@lru_cache(maxsize=None)
+def _icon_index(icons_dir: str) -> Dict[str, List[str]]:
+    """Index every .svg under icons_dir by stem, in rglob order (one walk per dir)."""
+    index: Dict[str, List[str]] = {}
+    stack = [icons_dir]
+    while stack:
+        d = stack.pop()
+        subdirs = []
         try:
-            content = svg_file.read_text()
-            # Extract just the content inside <svg>...</svg>
-            match = re.search(r'<svg[^>]*>(.*)</svg>', content, re.DOTALL)
-            if match:
-                return match.group(1)
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.endswith(".svg"):
+                        index.setdefault(entry.name[:-4], []).append(entry.path)
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+    return index
+
+
+@lru_cache(maxsize=None)
+def _load_icon(pattern: str, icons_dir: str) -> Optional[str]:
+    """Inner <svg> content for an icon file pattern (cached, types repeat a lot)."""
+    # First readable match wins, same as the recursive search it replaces
+    for svg_file in _icon_index(icons_dir).get(pattern, ()):
+        try:
+            with open(svg_file, encoding="utf-8") as f:
+                content = f.read()
+            # Extract just the content inside <svg>...</svg> (first open tag
+            # to last close tag, sliced rather than matched with a DOTALL regex)
+            start = content.find('<svg')
+            if start != -1:
+                start = content.find('>', start) + 1
+                end = content.rfind('</svg>')
+                if start and end >= start:
+                    return content[start:end]
         except Exception:
             continue
     
     return None
 
 
-def svg_arrow(from_pos: Position, to_pos: Position, tier_bounds: dict = None) -> str:
+def svg_arrow(out: TextIO, from_pos: Position, to_pos: Position, tier_bounds: dict = None) -> None:
     """Draw orthogonal arrow between nodes, respecting boundaries."""
     
+    from_cy = from_pos.cy
+    to_cy = to_pos.cy
+    
     # Determine if same row (horizontal) or different rows (vertical)
-    same_row = abs(from_pos.cy - to_pos.cy) < GRID * 2
+    same_row = -SAME_ROW_TOL < from_cy - to_cy < SAME_ROW_TOL
     
     if same_row:
         # Horizontal arrow - straight line
         x1 = from_pos.right + ARROW_GAP
-        y1 = from_pos.cy
+        y1 = from_cy
         x2 = to_pos.left - ARROW_GAP
-        y2 = to_pos.cy
-        return f'  <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>'
+        y2 = to_cy
+        out.write(f'  <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>\n')
     
     else:
         # Vertical connection - orthogonal routing
@@ -793,13 +1078,13 @@ def svg_arrow(from_pos: Position, to_pos: Position, tier_bounds: dict = None) ->
         
         if x1 == x2:
             # Straight vertical line
-            return f'  <path d="M{x1},{y1} L{x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>'
+            out.write(f'  <path d="M{x1},{y1} L{x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>\n')
         else:
             # L-shaped or Z-shaped route
-            return f'  <path d="M{x1},{y1} L{x1},{mid_y} L{x2},{mid_y} L{x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>'
+            out.write(f'  <path d="M{x1},{y1} L{x1},{mid_y} L{x2},{mid_y} L{x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>\n')
 
 
-def svg_user_arrow(user_pos: Position, target_pos: Position) -> str:
+def svg_user_arrow(out: TextIO, user_pos: Position, target_pos: Position) -> None:
     """Draw curved line from user to entry point."""
     x1 = user_pos.right
     y1 = user_pos.cy
@@ -807,15 +1092,16 @@ def svg_user_arrow(user_pos: Position, target_pos: Position) -> str:
     y2 = target_pos.cy
     
     ctrl_x = x1 + 24
-    return f'  <path d="M{x1},{y1} C{ctrl_x},{y1} {ctrl_x},{y2} {x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5"/>'
+    out.write(f'  <path d="M{x1},{y1} C{ctrl_x},{y1} {ctrl_x},{y2} {x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5"/>\n')
 
 
-def svg_user(pos: Position) -> str:
-    return f'''  <g class="user" transform="translate({pos.x},{pos.y})">
-    <circle cx="24" cy="12" r="9" fill="none" stroke="{COLORS['user']}" stroke-width="2"/>
-    <path d="M8,38 Q8,24 24,24 Q40,24 40,38" fill="none" stroke="{COLORS['user']}" stroke-width="2"/>
-    <text x="24" y="54" font-size="11" fill="{COLORS['text']}" text-anchor="middle">Users</text>
-  </g>'''
+def svg_user(out: TextIO, pos: Position) -> None:
+    write = out.write
+    write(f'  <g class="user" transform="translate({pos.x},{pos.y})">\n')
+    write(f'    <circle cx="24" cy="12" r="9" fill="none" stroke="{COLORS["user"]}" stroke-width="2"/>\n')
+    write(f'    <path d="M8,38 Q8,24 24,24 Q40,24 40,38" fill="none" stroke="{COLORS["user"]}" stroke-width="2"/>\n')
+    write(f'    <text x="24" y="54" font-size="11" fill="{COLORS["text"]}" text-anchor="middle">Users</text>\n')
+    write('  </g>\n')
 
 
 def generate_svg(
@@ -824,9 +1110,13 @@ def generate_svg(
     layout: dict,
     title: Optional[str] = None,
     show_user: bool = True,
-    icons_dir: Optional[Path] = None
-) -> str:
-    """Generate complete SVG."""
+    icons_dir: Optional[Path] = None,
+    out: Optional[TextIO] = None
+) -> Optional[str]:
+    """Generate complete SVG.
+    
+    Writes to `out` when given (and returns None), otherwise returns the SVG.
+    """
     positions = layout["positions"]
     tiers = layout["tiers"]
     vpc = layout.get("vpc")
@@ -834,50 +1124,49 @@ def generate_svg(
     height = layout["height"]
     user_pos = layout.get("user")
     
-    parts = [
-        f'<?xml version="1.0" encoding="UTF-8"?>',
-        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}"',
-        f'     style="font-family: -apple-system, BlinkMacSystemFont, \'Segoe UI\', Roboto, sans-serif;">',
-        svg_defs(),
-        f'  <rect width="100%" height="100%" fill="{COLORS["bg"]}"/>',
-    ]
+    to_str = out is None
+    if to_str:
+        out = io.StringIO()
+    write = out.write
+    write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    write(f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="{height}" viewBox="0 0 {width} {height}"\n')
+    write('     style="font-family: -apple-system, BlinkMacSystemFont, \'Segoe UI\', Roboto, sans-serif;">\n')
+    svg_defs(out)
+    write(f'  <rect width="100%" height="100%" fill="{COLORS["bg"]}"/>\n')
     
     # Title
     if title:
-        parts.append(f'  <text x="{CANVAS_PAD}" y="{CANVAS_PAD + 4 * GRID}" font-size="18" font-weight="600" fill="{COLORS["text"]}">{title}</text>')
+        write(f'  <text x="{CANVAS_PAD}" y="{CANVAS_PAD + 4 * GRID}" font-size="18" font-weight="600" fill="{COLORS["text"]}">{title}</text>\n')
     
     # VPC container (render first so it's behind everything)
     if vpc:
-        parts.append(svg_vpc(vpc))
+        svg_vpc(out, vpc)
     
     # Subnet tiers
     for tier_name, bounds in tiers.items():
-        parts.append(svg_tier(tier_name, bounds))
+        svg_tier(out, tier_name, bounds)
     
     # Nodes
     for res_id, pos in positions.items():
         if res_id in resources:
-            parts.append(svg_node(resources[res_id], pos, icons_dir))
+            svg_node(out, resources[res_id], pos, icons_dir)
     
     # Connections
     for conn in connections:
         if conn.from_id in positions and conn.to_id in positions:
-            parts.append(svg_arrow(positions[conn.from_id], positions[conn.to_id], tiers))
+            svg_arrow(out, positions[conn.from_id], positions[conn.to_id], tiers)
     
     # User
     if show_user and user_pos and positions:
-        parts.append(svg_user(user_pos))
+        svg_user(out, user_pos)
         
         # Connect user to first public resource
-        public_entries = [
-            res_id for res_id, res in resources.items()
-            if res.tier == "public" and res_id in positions
-        ]
-        if public_entries:
-            parts.append(svg_user_arrow(user_pos, positions[public_entries[0]]))
+        entry_id = layout.get("entry_points", {}).get("public")
+        if entry_id in positions:
+            svg_user_arrow(out, user_pos, positions[entry_id])
     
-    parts.append('</svg>')
-    return '\n'.join(parts)
+    write('</svg>')
+    return out.getvalue() if to_str else None
 
 
 # =============================================================================
@@ -895,6 +1184,7 @@ def main():
     parser.add_argument('--icons', help='Path to AWS icons directory')
     parser.add_argument('--flat', action='store_true', help='Flat layout (no tier grouping)')
     parser.add_argument('--no-user', action='store_true', help='Hide user icon')
+    parser.add_argument('--cache', action='store_true', help='Reuse parsed .tf files from ~/.cache/files2svg')
     
     args = parser.parse_args()
     
@@ -910,7 +1200,7 @@ def main():
     
     # Parse
     print(f"Parsing .tf files in {tf_dir}...", file=sys.stderr)
-    resources, security_groups, subnets = parse_tf_files(tf_dir)
+    resources, security_groups, subnets = parse_tf_files(tf_dir, use_cache=args.cache)
     
     if not resources:
         print("Warning: No resources found", file=sys.stderr)
@@ -918,27 +1208,24 @@ def main():
     # Filter
     visible = {k: v for k, v in resources.items() if v.resource_type not in SKIP_RESOURCES}
     
-    # Infer connections
+    # Infer connections (between visible resources only)
     connections = infer_connections(resources, security_groups)
     
-    # Filter connections to visible resources only
-    connections = [c for c in connections if c.from_id in visible and c.to_id in visible]
-    
     # Layout
-    layout = layout_resources(resources, connections, group_by_tier=not args.flat)
+    layout = layout_resources(visible, connections, group_by_tier=not args.flat)
     
-    # Generate
+    # Generate, then write; a failed render leaves an existing output untouched
     svg = generate_svg(visible, connections, layout, args.title, not args.no_user, icons_dir)
-    Path(args.output).write_text(svg)
+    Path(args.output).write_text(svg, encoding='utf-8')
     
     # Stats
     print(f"✓ {args.output}", file=sys.stderr)
     print(f"  {len(visible)} resources, {len(connections)} connections", file=sys.stderr)
     
-    by_tier = defaultdict(int)
+    by_tier = {}
     for res in visible.values():
-        by_tier[res.tier] += 1
-    print(f"  Tiers: {dict(by_tier)}", file=sys.stderr)
+        by_tier[res.tier] = by_tier.get(res.tier, 0) + 1
+    print(f"  Tiers: {by_tier}", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -17,17 +17,23 @@ UNIVERSAL RULES:
 4. User arrows connect to the FIRST node of each flow path
 5. Arrows only flow left-to-right within a row
 
+Requirements:
+    Python 3.10+
+
 Usage:
     terraform graph | python graph2svg.py - output.svg
     terraform graph | python graph2svg.py - output.svg --title "My Infra" --icons ./icons
 """
 
+import os
 import sys
 import re
 from pathlib import Path
-from collections import defaultdict
-from typing import Dict, List, Tuple, Optional, Set
+from itertools import groupby
+from operator import attrgetter
+from typing import Dict, List, Tuple, Optional, Set, TextIO
 from dataclasses import dataclass, field
+from functools import lru_cache
 
 # =============================================================================
 # DESIGN SYSTEM (8px grid)
@@ -46,6 +52,7 @@ MODULE_HDR = 4 * GRID   # 32px
 CANVAS_PAD = 8 * GRID   # 64px
 USER_W = 10 * GRID      # 80px
 ARROW_GAP = GRID        # 8px
+SAME_ROW_TOL = 2 * GRID # 16px max centre-y difference for a straight arrow
 
 COLORS = {
     "bg": "#ffffff",
@@ -119,6 +126,8 @@ FLOW_PATHS = {
 
 # Flow path display order (top to bottom within module)
 FLOW_ORDER = ["cdn", "api", "compute", "support"]
+# Row index of each flow; doubles as the O(1) "is this a laid-out flow" test
+FLOW_RANK = {flow: i for i, flow in enumerate(FLOW_ORDER)}
 
 # Entry points - first node of each flow that users connect to
 FLOW_ENTRIES = {
@@ -207,7 +216,7 @@ ICON_FILES = {
 # DATA STRUCTURES
 # =============================================================================
 
-@dataclass
+@dataclass(slots=True)
 class Node:
     id: str
     address: str
@@ -216,58 +225,85 @@ class Node:
     module: Optional[str] = None
     flow: str = "compute"
     position: int = 0
+    # Whether the node's name is drawn, worked out once at parse time
+    show_name: bool = field(init=False, repr=False, compare=False)
     
     def __post_init__(self):
         if self.resource_type in FLOW_PATHS:
             self.flow, self.position = FLOW_PATHS[self.resource_type]
-
-
-@dataclass
+        
+        # Only show name if it's different from module name and adds info
+        # Skip generic names that match module context
+        self.show_name = True
+        if self.module:
+            # Normalize for comparison
+            mod_lower = self.module.lower().replace("_", "").replace("-", "")
+            name_lower = self.name.lower().replace("_", "").replace("-", "")
+            # Hide if name is essentially the module name
+            if name_lower in mod_lower or mod_lower in name_lower:
+                self.show_name = False
+
+
+@dataclass(slots=True)
 class Edge:
     from_id: str
     to_id: str
 
 
-@dataclass
+@dataclass(slots=True)
 class Position:
     x: int
     y: int
     w: int = NODE_W
     h: int = NODE_H
+    # Derived edges/centre, computed once (positions are never moved)
+    cx: int = field(init=False, repr=False, compare=False)
+    cy: int = field(init=False, repr=False, compare=False)
+    right: int = field(init=False, repr=False, compare=False)
+    left: int = field(init=False, repr=False, compare=False)
     
-    @property
-    def cx(self) -> int: return self.x + self.w // 2
-    @property
-    def cy(self) -> int: return self.y + self.h // 2
-    @property
-    def right(self) -> int: return self.x + self.w
-    @property
-    def left(self) -> int: return self.x
+    def __post_init__(self):
+        self.cx = self.x + self.w // 2
+        self.cy = self.y + self.h // 2
+        self.right = self.x + self.w
+        self.left = self.x
+
+
+@dataclass(slots=True)
+class LayoutResult:
+    positions: Dict[str, Position]
+    modules: Dict[str, dict]                   # module name -> bounds + label
+    entry_points: List[Tuple[str, Position]]  # user arrow targets
+    user: Position
+    width: int
+    height: int
+    title_y: int
 
 
 # =============================================================================
 # DOT PARSER
 # =============================================================================
 
+EDGE_RE = re.compile(r'"([^"]+)"\s*->\s*"([^"]+)"')
+
+
 def parse_dot(content: str) -> Tuple[Dict[str, Node], List[Edge]]:
     """Parse terraform graph DOT output."""
     nodes: Dict[str, Node] = {}
     edges: List[Edge] = []
+    skipped: Set[str] = set()  # vars, providers etc. show up on many edges
     
-    edge_re = re.compile(r'"([^"]+)"\s*->\s*"([^"]+)"')
-    
-    for line in content.split('\n'):
-        match = edge_re.search(line)
-        if not match:
-            continue
-            
+    # One C-level scan over the whole buffer instead of a search per line
+    for match in EDGE_RE.finditer(content):
         src, tgt = match.groups()
         
-        for node_str in [src, tgt]:
-            if node_str not in nodes:
+        for node_str in (src, tgt):
+            if node_str not in nodes and node_str not in skipped:
                 node = parse_node(node_str)
                 if node:
                     nodes[node.id] = node
+                else:
+                    skipped.add(node_str)
         
         if src in nodes and tgt in nodes:
             edges.append(Edge(src, tgt))
@@ -285,7 +321,8 @@ def parse_node(s: str) -> Optional[Node]:
         return None
     
     clean = s.replace('[root] ', '').strip()
-    clean = re.sub(r'\s*\(expand\)\s*$', '', clean)
+    if clean.endswith('(expand)'):
+        clean = clean[:-8].rstrip()
     
     module = None
     resource_part = clean
@@ -323,34 +360,39 @@ def filter_edges(nodes: Dict[str, Node], edges: List[Edge]) -> Tuple[List[Edge],
     - Add implicit flow arrows for adjacent nodes in same flow path
     - Identify cross-module connections
     """
-    visible = set(nodes.keys())
     intra_result = []
     cross_result = []
     seen = set()
     
+    # (module, flow, position) per node, built once; support services are
+    # left out so a single lookup covers both the visibility and skip tests
+    flow_info = {
+        node.id: (node.module, node.flow, node.position)
+        for node in nodes.values()
+        if node.resource_type not in SUPPORT_SERVICES
+    }
+    
     # First, collect explicit edges
     for e in edges:
-        if e.from_id not in visible or e.to_id not in visible:
-            continue
-        
-        from_node = nodes[e.from_id]
-        to_node = nodes[e.to_id]
-        
-        # Skip edges involving support services
-        if from_node.resource_type in SUPPORT_SERVICES:
+        from_info = flow_info.get(e.from_id)
+        if from_info is None:
             continue
-        if to_node.resource_type in SUPPORT_SERVICES:
+        to_info = flow_info.get(e.to_id)
+        if to_info is None:
             continue
         
+        from_module, from_flow, from_position = from_info
+        to_module, to_flow, to_position = to_info
+        
         # Check if cross-module
-        is_cross_module = from_node.module != to_node.module
+        is_cross_module = from_module != to_module
         
         # For same-module, skip cross-flow edges
-        if not is_cross_module and from_node.flow != to_node.flow:
+        if not is_cross_module and from_flow != to_flow:
             continue
         
         # Determine visual direction (reverse TF dependency to show data flow)
-        if from_node.position > to_node.position:
+        if from_position > to_position:
             visual_from, visual_to = e.to_id, e.from_id
         else:
             visual_from, visual_to = e.from_id, e.to_id
@@ -364,29 +406,26 @@ def filter_edges(nodes: Dict[str, Node], edges: List[Edge]) -> Tuple[List[Edge],
                 intra_result.append(Edge(visual_from, visual_to))
     
     # Second, add implicit flow arrows for adjacent positions in same flow
-    # Group nodes by (module, flow)
-    by_module_flow: Dict[Tuple[str, str], List[Node]] = defaultdict(list)
-    for node in nodes.values():
+    # One sort over (group, position, name) instead of a dict of per-group
+    # lists; groups are numbered in first-seen (module, flow) order
+    group_index: Dict[Tuple[str, str], int] = {}
+    flow_items = []
+    for i, node in enumerate(nodes.values()):
         if node.resource_type not in SUPPORT_SERVICES:
             key = (node.module or "_root", node.flow)
-            by_module_flow[key].append(node)
+            group = group_index.setdefault(key, len(group_index))
+            flow_items.append((group, node.position, node.name, i, node.id))
+    flow_items.sort()
     
-    for (mod, flow), flow_nodes in by_module_flow.items():
-        if len(flow_nodes) < 2:
+    # Connect adjacent nodes within each group
+    for prev, cur in zip(flow_items, flow_items[1:]):
+        if prev[0] != cur[0]:
             continue
         
-        # Sort by position
-        flow_nodes.sort(key=lambda n: (n.position, n.name))
-        
-        # Connect adjacent nodes
-        for i in range(len(flow_nodes) - 1):
-            from_node = flow_nodes[i]
-            to_node = flow_nodes[i + 1]
-            
-            edge_key = (from_node.id, to_node.id)
-            if edge_key not in seen:
-                seen.add(edge_key)
-                intra_result.append(Edge(from_node.id, to_node.id))
+        edge_key = (prev[4], cur[4])
+        if edge_key not in seen:
+            seen.add(edge_key)
+            intra_result.append(Edge(prev[4], cur[4]))
     
     # Third, detect semantic cross-module connections
     # Rule: If module A has a CDN/routing endpoint and module B has a compute entry,
@@ -423,103 +462,105 @@ def filter_edges(nodes: Dict[str, Node], edges: List[Edge]) -> Tuple[List[Edge],
 # LAYOUT ENGINE
 # =============================================================================
 
-def layout(nodes: Dict[str, Node], title: str = None) -> dict:
+@lru_cache(maxsize=256)
+def module_label(mod_name: str) -> str:
+    """Display label for a module ("_root" -> "Root", "api_v2" -> "Api V2")."""
+    return mod_name.replace("_", " ").title() if mod_name != "_root" else "Root"
+
+
+def layout(nodes: Dict[str, Node], title: str = None) -> LayoutResult:
     """
     Multi-row layout: each flow path gets its own row within a module.
+    
+    A graph with nothing to draw gets an empty canvas of just the padding
+    (and title).
     """
-    # Group nodes by module
-    by_module: Dict[str, List[Node]] = defaultdict(list)
-    for node in nodes.values():
-        by_module[node.module or "_root"].append(node)
+    # One stable sort puts nodes in display order: root module first, then
+    # modules by name, flows in FLOW_ORDER, position/name within each flow.
+    # Nodes whose flow has no row are never drawn, so drop them up front.
+    ordered = sorted(
+        (n for n in nodes.values() if n.flow in FLOW_RANK),
+        key=lambda n: (
+            bool(n.module), n.module or "", FLOW_RANK[n.flow], n.position, n.name
+        ),
+    )
     
-    # Module order
-    mod_order = []
-    if "_root" in by_module:
-        mod_order.append("_root")
-    mod_order.extend(sorted(m for m in by_module if m != "_root"))
+    title_h = 6 * GRID if title else 0
+    if not ordered:
+        return LayoutResult(
+            positions={},
+            modules={},
+            entry_points=[],
+            user=Position(x=CANVAS_PAD, y=CANVAS_PAD + title_h, w=48, h=60),
+            width=2 * CANVAS_PAD,
+            height=title_h + 2 * CANVAS_PAD,
+            title_y=CANVAS_PAD + 4 * GRID if title else 0,
+        )
     
     positions: Dict[str, Position] = {}
     mod_bounds = {}
     entry_points = []  # (node_id, Position) for user arrows
     
-    title_h = 6 * GRID if title else 0
-    y = CANVAS_PAD + title_h
-    max_w = 0
+    top = CANVAS_PAD + title_h  # First module's y
+    y = top
+    mod_x = CANVAS_PAD + USER_W  # Modules are left-aligned in one column
+    max_mod_w = 0
     
-    for mod_name in mod_order:
-        mod_nodes = by_module[mod_name]
-        if not mod_nodes:
-            continue
-        
-        # Group by flow path, sort by position within flow
-        by_flow: Dict[str, List[Node]] = defaultdict(list)
-        for node in mod_nodes:
-            by_flow[node.flow].append(node)
-        
-        for flow in by_flow:
-            by_flow[flow].sort(key=lambda n: (n.position, n.name))
-        
-        # Determine which flows are present (in display order)
-        present_flows = [f for f in FLOW_ORDER if f in by_flow and by_flow[f]]
-        
-        if not present_flows:
-            continue
+    for mod_name, mod_nodes in groupby(ordered, key=lambda n: n.module or "_root"):
+        # One row per flow path present, already in display order
+        rows = [list(flow_nodes) for _, flow_nodes in groupby(mod_nodes, key=attrgetter("flow"))]
+        present_flows = [row[0].flow for row in rows]
         
         # Calculate module dimensions
-        max_nodes_in_row = max(len(by_flow[f]) for f in present_flows)
-        num_rows = len(present_flows)
+        max_nodes_in_row = max(map(len, rows))
+        num_rows = len(rows)
         
         content_w = max_nodes_in_row * NODE_W + (max_nodes_in_row - 1) * H_GAP
         content_h = num_rows * NODE_H + (num_rows - 1) * V_GAP
         
         mod_w = content_w + MODULE_PAD * 2
         mod_h = content_h + MODULE_PAD * 2 + MODULE_HDR
-        mod_x = CANVAS_PAD + USER_W
         
         mod_bounds[mod_name] = {
             "x": mod_x, "y": y, "w": mod_w, "h": mod_h,
-            "label": mod_name.replace("_", " ").title() if mod_name != "_root" else "Root"
+            "label": module_label(mod_name)
         }
         
         # Position nodes row by row
         row_y = y + MODULE_HDR + MODULE_PAD
         
-        for flow in present_flows:
-            flow_nodes = by_flow[flow]
+        for flow, flow_nodes in zip(present_flows, rows):
             row_x = mod_x + MODULE_PAD
             
-            # Track first node in flow for user arrow entry point
-            first_node = flow_nodes[0] if flow_nodes else None
-            
-            for i, node in enumerate(flow_nodes):
-                pos = Position(x=row_x, y=row_y)
-                positions[node.id] = pos
-                
-                # Mark entry points
-                if i == 0 and flow != "support":
-                    entry_types = FLOW_ENTRIES.get(flow, set())
-                    if node.resource_type in entry_types:
-                        entry_points.append((node.id, pos))
-                
+            for node in flow_nodes:
+                positions[node.id] = Position(x=row_x, y=row_y)
                 row_x += NODE_W + H_GAP
             
+            # First node of the flow is the user arrow's entry point if it
+            # is an entry type (support has none)
+            first_node = flow_nodes[0]
+            if flow != "support" and first_node.resource_type in FLOW_ENTRIES.get(flow, ()):
+                entry_points.append((first_node.id, positions[first_node.id]))
+            
             row_y += NODE_H + V_GAP
         
-        max_w = max(max_w, mod_x + mod_w)
+        if mod_w > max_mod_w:
+            max_mod_w = mod_w
         y += mod_h + MODULE_GAP
     
-    canvas_h = y - MODULE_GAP + CANVAS_PAD
-    user_y = CANVAS_PAD + title_h + (canvas_h - title_h - CANVAS_PAD * 2) // 2 - 30
-    
-    return {
-        "positions": positions,
-        "modules": mod_bounds,
-        "entry_points": entry_points,
-        "user": Position(x=CANVAS_PAD, y=user_y, w=48, h=60),
-        "width": max_w + CANVAS_PAD,
-        "height": canvas_h,
-        "title_y": CANVAS_PAD + 4 * GRID if title else 0,
-    }
+    # Height of the module column; the user icon is centred against it
+    content_h = y - MODULE_GAP - top
+    user_y = top + content_h // 2 - 30
+    
+    return LayoutResult(
+        positions=positions,
+        modules=mod_bounds,
+        entry_points=entry_points,
+        user=Position(x=CANVAS_PAD, y=user_y, w=48, h=60),
+        width=mod_x + max_mod_w + CANVAS_PAD,
+        height=top + content_h + CANVAS_PAD,
+        title_y=CANVAS_PAD + 4 * GRID if title else 0,
+    )
 
 
 # =============================================================================
@@ -609,10 +650,52 @@ EMBEDDED_ICONS["aws_lb"] = EMBEDDED_ICONS["aws_api_gateway_rest_api"]  # Use API
 EMBEDDED_ICONS["aws_alb"] = EMBEDDED_ICONS["aws_api_gateway_rest_api"]
 
 
+def _minify_icon(svg: str) -> str:
+    """Drop layout whitespace, ids (unreferenced, and they clash once an icon
+    is reused) and stroke="none" (the SVG default; nothing above sets a stroke)."""
+    svg = re.sub(r'\s+id="[^"]*"', '', svg)
+    svg = svg.replace(' stroke="none"', '')
+    svg = re.sub(r'>\s+<', '><', svg)
+    return re.sub(r'\s+', ' ', svg).strip()
+
+
+# Minify once at import; aliases keep sharing one string
+_minified: Dict[int, str] = {}
+EMBEDDED_ICONS = {
+    k: _minified.setdefault(id(v), _minify_icon(v)) for k, v in EMBEDDED_ICONS.items()
+}
+del _minified
+
+
 # =============================================================================
 # ICON LOADING
 # =============================================================================
 
+SVG_BODY_RE = re.compile(r'<svg[^>]*>(.*)</svg>', re.DOTALL)
+
+
+# Same walker as files2svg._icon_index; keep the two in step
+@lru_cache(maxsize=None)
+def _icon_index(icons_dir: str) -> Dict[str, List[str]]:
+    """Index every .svg under icons_dir by stem, in rglob order (one walk per dir)."""
+    index: Dict[str, List[str]] = {}
+    stack = [icons_dir]
+    while stack:
+        d = stack.pop()
+        subdirs = []
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                    elif entry.name.endswith(".svg"):
+                        index.setdefault(entry.name[:-4], []).append(entry.path)
+        except OSError:
+            continue
+        stack.extend(reversed(subdirs))
+    return index
+
+
 def get_icon(resource_type: str, icons_dir: Optional[Path] = None) -> Optional[str]:
     """Get icon SVG content - first check embedded, then external."""
     # First try embedded icons
@@ -620,17 +703,26 @@ def get_icon(resource_type: str, icons_dir: Optional[Path] = None) -> Optional[s
         return EMBEDDED_ICONS[resource_type]
     
     # Then try external icons directory
-    if icons_dir and icons_dir.exists():
+    if icons_dir:
         icon_file = ICON_FILES.get(resource_type)
         if icon_file:
-            for path in icons_dir.rglob(icon_file):
-                try:
-                    content = path.read_text()
-                    match = re.search(r'<svg[^>]*>(.*)</svg>', content, re.DOTALL)
-                    if match:
-                        return match.group(1)
-                except:
-                    pass
+            return _load_icon(icon_file, str(icons_dir))
+    
+    return None
+
+
+@lru_cache(maxsize=256)
+def _load_icon(icon_file: str, icons_dir: str) -> Optional[str]:
+    """Inner <svg> content of the first readable icon_file under icons_dir (cached)."""
+    for path in _icon_index(icons_dir).get(icon_file.removesuffix(".svg"), ()):
+        try:
+            with open(path) as f:
+                content = f.read()
+            match = SVG_BODY_RE.search(content)
+            if match:
+                return match.group(1)
+        except:
+            pass
     
     return None
 
@@ -640,7 +732,11 @@ def get_icon(resource_type: str, icons_dir: Optional[Path] = None) -> Optional[s
 # =============================================================================
 
 def esc(s: str) -> str:
-    return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    s = s if type(s) is str else str(s)
+    # Terraform names almost never need escaping; skip the replace chain
+    if "&" not in s and "<" not in s and ">" not in s:
+        return s
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
 
 def trunc(s: str, max_len: int = 12) -> str:
@@ -651,71 +747,71 @@ def get_color(category: str) -> str:
     return COLORS.get(category, COLORS["default"])
 
 
-def svg_defs() -> str:
-    return f'''  <defs>
-    <marker id="arrow" markerWidth="8" markerHeight="6" refX="7" refY="3" orient="auto">
-      <path d="M0,0 L0,6 L8,3 z" fill="{COLORS['arrow']}"/>
+@lru_cache(maxsize=None)
+def node_style(resource_type: str) -> Tuple[str, str, str]:
+    """(escaped label, abbrev, color) for a node of this type (cached per type)."""
+    label, abbrev, category = SERVICE_INFO.get(resource_type, (resource_type, "?", "default"))
+    return esc(label), abbrev, get_color(category)
+
+
+# Markers and the drop-shadow filter never change, so build them once
+SVG_DEFS_STATIC = f'''    <marker id="arrow" markerWidth="8" markerHeight="6" refX="7" refY="3" orient="auto">
+      <path d="M0,0 L0,6 L8,3 z" fill="{COLORS["arrow"]}"/>
     </marker>
     <marker id="arrow-mid" markerWidth="10" markerHeight="8" refX="5" refY="4" orient="auto">
-      <path d="M0,0 L10,4 L0,8 z" fill="{COLORS['arrow']}"/>
+      <path d="M0,0 L10,4 L0,8 z" fill="{COLORS["arrow"]}"/>
     </marker>
     <filter id="shadow" x="-20%" y="-20%" width="140%" height="140%">
       <feDropShadow dx="0" dy="2" stdDeviation="3" flood-opacity="0.1"/>
     </filter>
-  </defs>'''
+'''
 
 
-def svg_module(b: dict) -> str:
+def svg_defs(parts: List[str], icons: Dict[str, str] = None) -> None:
+    """Markers, filters and each distinct icon body (as <g id=...> for <use>)."""
+    append = parts.append
+    append('  <defs>\n')
+    append(SVG_DEFS_STATIC)
+    for icon_id, body in (icons or {}).items():
+        append(f'    <g id="{icon_id}">\n{body}\n    </g>\n')
+    append('  </defs>\n')
+
+
+def svg_module(parts: List[str], b: dict) -> None:
     x, y, w, h = b["x"], b["y"], b["w"], b["h"]
-    return f'''  <g class="module">
-    <rect x="{x}" y="{y}" width="{w}" height="{h}" fill="{COLORS['module_bg']}" stroke="{COLORS['module_border']}" rx="8"/>
-    <rect x="{x}" y="{y}" width="{w}" height="{MODULE_HDR}" fill="{COLORS['module_hdr']}" rx="8"/>
-    <rect x="{x}" y="{y + MODULE_HDR - 8}" width="{w}" height="8" fill="{COLORS['module_hdr']}"/>
-    <text x="{x + 16}" y="{y + 21}" font-size="13" font-weight="600" fill="{COLORS['text_inv']}">{esc(b['label'])}</text>
-  </g>'''
+    parts.append(f'''  <g class="module">
+    <rect x="{x}" y="{y}" width="{w}" height="{h}" fill="{COLORS["module_bg"]}" stroke="{COLORS["module_border"]}" rx="8"/>
+    <rect x="{x}" y="{y}" width="{w}" height="{MODULE_HDR}" fill="{COLORS["module_hdr"]}" rx="8"/>
+    <rect x="{x}" y="{y + MODULE_HDR - 8}" width="{w}" height="8" fill="{COLORS["module_hdr"]}"/>
+    <text x="{x + 16}" y="{y + 21}" font-size="13" font-weight="600" fill="{COLORS["text_inv"]}">{esc(b['label'])}</text>
+  </g>
+''')
 
 
-def svg_node(node: Node, pos: Position, icon_svg: Optional[str] = None) -> str:
-    x, y = pos.x, pos.y
-    info = SERVICE_INFO.get(node.resource_type, (node.resource_type, "?", "default"))
-    label, abbrev, category = info
-    color = get_color(category)
-    name = trunc(node.name)
+def svg_node(parts: List[str], node: Node, pos: Position, icon_id: Optional[str] = None) -> None:
+    x, y, cx = pos.x, pos.y, pos.cx
+    label, abbrev, color = node_style(node.resource_type)
     
     icon_x = x + (NODE_W - ICON_SIZE) // 2
     icon_y = y + 12
     
-    if icon_svg:
+    append = parts.append
+    append(f'  <g class="node">\n    <rect x="{x}" y="{y}" width="{NODE_W}" height="{NODE_H}" fill="{COLORS["node_bg"]}" stroke="{COLORS["node_border"]}" rx="6" filter="url(#shadow)"/>\n')
+    
+    if icon_id:
         scale = ICON_SIZE / 64
-        icon_content = f'''    <g transform="translate({icon_x},{icon_y}) scale({scale})">
-{icon_svg}
-    </g>'''
+        append(f'    <use xlink:href="#{icon_id}" transform="translate({icon_x},{icon_y}) scale({scale})"/>\n')
     else:
-        icon_content = f'''    <rect x="{icon_x}" y="{icon_y}" width="{ICON_SIZE}" height="{ICON_SIZE}" rx="6" fill="{color}"/>
-    <text x="{icon_x + ICON_SIZE//2}" y="{icon_y + 32}" font-size="14" font-weight="600" fill="white" text-anchor="middle">{abbrev}</text>'''
-    
-    # Only show name if it's different from module name and adds info
-    # Skip generic names that match module context
-    show_name = True
-    if node.module:
-        # Normalize for comparison
-        mod_lower = node.module.lower().replace("_", "").replace("-", "")
-        name_lower = node.name.lower().replace("_", "").replace("-", "")
-        # Hide if name is essentially the module name
-        if name_lower in mod_lower or mod_lower in name_lower:
-            show_name = False
-    
-    name_line = f'    <text x="{x + NODE_W//2}" y="{y + NODE_H - 10}" font-size="11" fill="{COLORS["text"]}" text-anchor="middle">{esc(name)}</text>' if show_name else ''
-    
-    return f'''  <g class="node">
-    <rect x="{x}" y="{y}" width="{NODE_W}" height="{NODE_H}" fill="{COLORS['node_bg']}" stroke="{COLORS['node_border']}" rx="6" filter="url(#shadow)"/>
-{icon_content}
-    <text x="{x + NODE_W//2}" y="{y + NODE_H - 24}" font-size="9" fill="{COLORS['text2']}" text-anchor="middle">{esc(label)}</text>
-{name_line}
-  </g>'''
-
-
-def svg_arrow(from_pos: Position, to_pos: Position) -> str:
+        append(f'    <rect x="{icon_x}" y="{icon_y}" width="{ICON_SIZE}" height="{ICON_SIZE}" rx="6" fill="{color}"/>\n'
+               f'    <text x="{icon_x + ICON_SIZE//2}" y="{icon_y + 32}" font-size="14" font-weight="600" fill="white" text-anchor="middle">{abbrev}</text>\n')
+    
+    append(f'    <text x="{cx}" y="{y + NODE_H - 24}" font-size="9" fill="{COLORS["text2"]}" text-anchor="middle">{label}</text>\n')
+    if node.show_name:
+        append(f'    <text x="{cx}" y="{y + NODE_H - 10}" font-size="11" fill="{COLORS["text"]}" text-anchor="middle">{esc(trunc(node.name))}</text>\n')
+    append('  </g>\n')
+
+
+def svg_arrow(parts: List[str], from_pos: Position, to_pos: Position) -> None:
     """Draw arrow between two nodes."""
     x1 = from_pos.right + ARROW_GAP
     y1 = from_pos.cy
@@ -723,32 +819,17 @@ def svg_arrow(from_pos: Position, to_pos: Position) -> str:
     y2 = to_pos.cy
     
     # Same row - straight line
-    if abs(y1 - y2) < GRID * 2:
-        return f'  <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>'
+    if -SAME_ROW_TOL < y1 - y2 < SAME_ROW_TOL:
+        parts.append(f'  <line x1="{x1}" y1="{y1}" x2="{x2}" y2="{y2}" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>\n')
+        return
     
     # Different rows - orthogonal routing
     mid_x = (x1 + x2) // 2
-    return f'  <path d="M{x1},{y1} L{mid_x},{y1} L{mid_x},{y2} L{x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>'
+    parts.append(f'  <path d="M{x1},{y1} L{mid_x},{y1} L{mid_x},{y2} L{x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5" marker-end="url(#arrow)"/>\n')
 
 
-def svg_user_arrow(user_pos: Position, target_pos: Position, offset: int = 0) -> str:
-    """Draw curved line from user to entry point (no arrowhead)."""
-    x1 = user_pos.right
-    y1 = user_pos.cy + offset
-    x2 = target_pos.left - ARROW_GAP
-    y2 = target_pos.cy
-    
-    # Bezier curve, no marker
-    ctrl_x = x1 + 24
-    return f'  <path d="M{x1},{y1} C{ctrl_x},{y1} {ctrl_x},{y2} {x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5"/>'
-
-
-def svg_cross_module_arrow(from_pos: Position, to_pos: Position) -> str:
-    """Draw dashed curved line for cross-module API calls.
-    
-    Uses dashed style to indicate bidirectional request/response flow.
-    No arrowheads - the connection itself shows the relationship.
-    """
+def cross_module_curve(from_pos: Position, to_pos: Position) -> str:
+    """Path data for the curve between two nodes in different modules."""
     x1 = from_pos.cx
     y1 = from_pos.y + from_pos.h + ARROW_GAP
     x2 = to_pos.cx
@@ -761,84 +842,128 @@ def svg_cross_module_arrow(from_pos: Position, to_pos: Position) -> str:
     
     mid_y = (y1 + y2) // 2
     
-    return f'  <path d="M{x1},{y1} C{x1},{mid_y} {x2},{mid_y} {x2},{y2}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5" stroke-dasharray="4,3"/>'
+    return f'M{x1},{y1} C{x1},{mid_y} {x2},{mid_y} {x2},{y2}'
 
 
-def svg_user(pos: Position) -> str:
-    return f'''  <g class="user" transform="translate({pos.x},{pos.y})">
+def svg_user_arrows(parts: List[str], user_pos: Position,
+                    entries: List[Tuple[str, Position]]) -> None:
+    """Draw curved lines from user to entry points (no arrowheads).
+    
+    The curves leave the user 12px apart, centred on it. Unmarked curves
+    share a stroke, so they go out as one <path> with a subpath each.
+    """
+    x1 = user_pos.right
+    ctrl_x = x1 + 24
+    y1 = user_pos.cy - (len(entries) // 2) * 12
+    
+    curves = []
+    for _, pos in entries:
+        x2 = pos.left - ARROW_GAP
+        y2 = pos.cy
+        # Bezier curve
+        curves.append(f'M{x1},{y1} C{ctrl_x},{y1} {ctrl_x},{y2} {x2},{y2}')
+        y1 += 12
+    
+    parts.append(f'  <path d="{" ".join(curves)}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5"/>\n')
+
+
+def svg_cross_module_arrows(parts: List[str], curves: List[str]) -> None:
+    """Draw dashed curved lines for cross-module API calls.
+    
+    Uses dashed style to indicate bidirectional request/response flow.
+    No arrowheads - the connection itself shows the relationship - so all
+    curves go out as one <path> with a subpath each.
+    """
+    parts.append(f'  <path d="{" ".join(curves)}" fill="none" stroke="{COLORS["arrow"]}" stroke-width="1.5" stroke-dasharray="4,3"/>\n')
+
+
+def svg_user(parts: List[str], pos: Position) -> None:
+    parts.append(f'''  <g class="user" transform="translate({pos.x},{pos.y})">
     <circle cx="24" cy="12" r="9" fill="none" stroke="{COLORS['user']}" stroke-width="2"/>
     <path d="M8,38 Q8,24 24,24 Q40,24 40,38" fill="none" stroke="{COLORS['user']}" stroke-width="2"/>
     <text x="24" y="54" font-size="11" fill="{COLORS['text']}" text-anchor="middle">Users</text>
-  </g>'''
+  </g>
+''')
 
 
-def generate_svg(nodes: Dict[str, Node], edges: List[Edge], 
+def generate_svg(nodes: Dict[str, Node], edges: List[Edge],
                  cross_edges: List[Edge] = None,
                  icons_dir: Optional[Path] = None,
-                 title: str = None, show_user: bool = True) -> str:
-    """Generate complete SVG."""
-    
-    L = layout(nodes, title)
-    positions = L["positions"]
-    w, h = int(L["width"]), int(L["height"])
+                 title: str = None, show_user: bool = True,
+                 out: Optional[TextIO] = None) -> Optional[str]:
+    """Generate complete SVG.
     
-    # Load icons (embedded first, then external)
-    icon_cache = {}
-    for node in nodes.values():
-        if node.resource_type not in icon_cache:
-            icon_cache[node.resource_type] = get_icon(node.resource_type, icons_dir)
+    Every svg_* helper appends newline-terminated fragments to one list.
+    The list is written to `out` when given (and None returned), otherwise
+    joined and returned.
+    """
     
-    parts = [
-        '<?xml version="1.0" encoding="UTF-8"?>',
-        f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}"',
-        f'     style="font-family: -apple-system, BlinkMacSystemFont, \'Segoe UI\', Roboto, sans-serif;">',
-        svg_defs(),
-        f'  <rect width="100%" height="100%" fill="{COLORS["bg"]}"/>',
-    ]
+    L = layout(nodes, title)
+    positions = L.positions
+    w, h = int(L.width), int(L.height)
+    
+    # Load icons (embedded first, then external). Each distinct icon body is
+    # emitted once in <defs> and instanced per node with <use>; aliased types
+    # (e.g. Lambda URL -> Lambda) share the same definition.
+    icon_cache = {}   # resource_type -> icon id (or None)
+    icon_defs = {}    # icon id -> body
+    body_ids = {}     # body -> icon id
+    for node_id in positions:
+        rtype = nodes[node_id].resource_type
+        if rtype not in icon_cache:
+            body = get_icon(rtype, icons_dir)
+            if body and body not in body_ids:
+                body_ids[body] = f"icon-{rtype}"
+                icon_defs[body_ids[body]] = body
+            icon_cache[rtype] = body_ids.get(body) if body else None
+    
+    parts: List[str] = []
+    append = parts.append
+    append('<?xml version="1.0" encoding="UTF-8"?>\n')
+    append(f'<svg xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink" width="{w}" height="{h}" viewBox="0 0 {w} {h}"\n')
+    append('     style="font-family: -apple-system, BlinkMacSystemFont, \'Segoe UI\', Roboto, sans-serif;">\n')
+    svg_defs(parts, icon_defs)
+    append(f'  <rect width="100%" height="100%" fill="{COLORS["bg"]}"/>\n')
     
     # Title
     if title:
-        parts.append(f'  <text x="{CANVAS_PAD}" y="{L["title_y"]}" font-size="18" font-weight="600" fill="{COLORS["text"]}">{esc(title)}</text>')
+        append(f'  <text x="{CANVAS_PAD}" y="{L.title_y}" font-size="18" font-weight="600" fill="{COLORS["text"]}">{esc(title)}</text>\n')
     
     # Modules
-    for b in L["modules"].values():
-        parts.append(svg_module(b))
+    for b in L.modules.values():
+        svg_module(parts, b)
     
     # Nodes
     for node_id, pos in positions.items():
         node = nodes[node_id]
-        icon = icon_cache.get(node.resource_type)
-        parts.append(svg_node(node, pos, icon))
+        svg_node(parts, node, pos, icon_cache.get(node.resource_type))
     
     # Intra-module dependency arrows (solid)
     for edge in edges:
         if edge.from_id in positions and edge.to_id in positions:
-            from_pos = positions[edge.from_id]
-            to_pos = positions[edge.to_id]
-            parts.append(svg_arrow(from_pos, to_pos))
+            svg_arrow(parts, positions[edge.from_id], positions[edge.to_id])
     
     # Cross-module arrows (dashed)
     if cross_edges:
-        for edge in cross_edges:
-            if edge.from_id in positions and edge.to_id in positions:
-                from_pos = positions[edge.from_id]
-                to_pos = positions[edge.to_id]
-                parts.append(svg_cross_module_arrow(from_pos, to_pos))
+        curves = [
+            cross_module_curve(positions[edge.from_id], positions[edge.to_id])
+            for edge in cross_edges
+            if edge.from_id in positions and edge.to_id in positions
+        ]
+        if curves:
+            svg_cross_module_arrows(parts, curves)
     
     # User arrows
-    if show_user and L["entry_points"]:
-        user_pos = L["user"]
-        parts.append(svg_user(user_pos))
-        
-        entries = L["entry_points"]
-        n_entries = len(entries)
-        
-        for i, (nid, pos) in enumerate(entries):
-            offset = (i - n_entries // 2) * 12
-            parts.append(svg_user_arrow(user_pos, pos, offset))
-    
-    parts.append('</svg>')
-    return '\n'.join(parts)
+    if show_user and L.entry_points:
+        user_pos = L.user
+        svg_user(parts, user_pos)
+        svg_user_arrows(parts, user_pos, L.entry_points)
+    
+    append('</svg>')
+    if out is None:
+        return ''.join(parts)
+    out.writelines(parts)
+    return None
 
 
 # =============================================================================
@@ -881,7 +1006,7 @@ def main():
     # Icons directory
     icons_dir = Path(args.icons) if args.icons else None
     
-    # Generate
+    # Generate, then write; a failed render leaves an existing output untouched
     svg = generate_svg(
         nodes, 
         intra_edges, 
@@ -890,7 +1015,7 @@ def main():
         args.title, 
         not args.no_user
     )
-    Path(args.output).write_text(svg)
+    Path(args.output).write_text(svg, encoding='utf-8')
     
     # Stats
     modules = set(n.module or "_root" for n in nodes.values())
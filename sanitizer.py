@@ -11,6 +11,8 @@ Usage:
     
     Or pipe directly:
     terraform show -json | python sanitizer.py - clean.json
+    
+    Add --compact to write minified JSON instead of indented.
 
 Input:  Raw terraform show -json output (contains secrets)
 Output: Clean JSON with only diagram-relevant data (safe to commit)
@@ -22,7 +24,7 @@ from pathlib import Path
 
 
 # Resources to include in diagrams
-DIAGRAM_RESOURCES = {
+DIAGRAM_RESOURCES = frozenset({
     # Compute
     "aws_instance",
     "aws_launch_template",
@@ -162,10 +164,10 @@ DIAGRAM_RESOURCES = {
     "aws_codepipeline",
     "aws_codedeploy_app",
     "aws_amplify_app",
-}
+})
 
 # Attributes safe to extract (no secrets)
-SAFE_ATTRIBUTES = {
+SAFE_ATTRIBUTES = frozenset({
     "name",
     "bucket",
     "function_name",
@@ -179,7 +181,33 @@ SAFE_ATTRIBUTES = {
     "availability_zones",
     "tags",
     "tags_all",
-}
+})
+
+# Attributes tried (in order) for a label when there is no Name tag
+LABEL_ATTRIBUTES = ("name", "bucket", "function_name", "cluster_name", "domain_name")
+
+
+# Inputs at least this large are parsed with orjson when it's installed;
+# below that, loading the extension (~6ms) costs more than it saves
+# (load_json is the same in tf2diagram.py, tf2svg.py and sanitizer.py)
+ORJSON_MIN_BYTES = 1 << 20
+
+
+def load_json(raw: bytes):
+    """Parse terraform JSON, with orjson for large inputs when available."""
+    if len(raw) >= ORJSON_MIN_BYTES:
+        try:
+            import orjson
+        except ImportError:
+            pass
+        else:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # orjson is stricter than json (e.g. it rejects NaN/Infinity);
+                # let the stdlib parser have the final say
+                pass
+    return json.loads(raw)
 
 
 def extract_label(resource):
@@ -192,9 +220,9 @@ def extract_label(resource):
         return tags["Name"]
     
     # Try common name attributes
-    for attr in ["name", "bucket", "function_name", "cluster_name", "domain_name"]:
-        if values.get(attr):
-            return values[attr]
+    for attr in LABEL_ATTRIBUTES:
+        if label := values.get(attr):
+            return label
     
     # Fall back to resource name from address
     return resource.get("name", "unknown")
@@ -202,19 +230,20 @@ def extract_label(resource):
 
 def extract_module_name(address):
     """Extract module name from resource address."""
-    if address.startswith("module."):
-        parts = address.split(".")
-        if len(parts) >= 2:
-            return parts[1]
-    return None
+    if not address.startswith("module."):
+        return None
+    # "module.foo.aws_x.y" -> "foo", without splitting the whole address
+    name, _, _ = address[7:].partition(".")
+    return name
 
 
 def extract_safe_attributes(values):
     """Extract only safe attributes from resource values."""
     safe = {}
-    for attr in SAFE_ATTRIBUTES:
-        if attr in values and values[attr] is not None:
-            value = values[attr]
+    # Only visit the safe attributes this resource actually has
+    for attr in SAFE_ATTRIBUTES & values.keys():
+        value = values[attr]
+        if value is not None:
             # Sanitize tags - remove any that look sensitive
             if attr in ("tags", "tags_all") and isinstance(value, dict):
                 value = {k: v for k, v in value.items() 
@@ -224,35 +253,39 @@ def extract_safe_attributes(values):
 
 
 def parse_resources(root_module):
-    """Recursively parse resources from root_module and child_modules."""
+    """Parse resources from root_module and (depth-first) its child_modules."""
     resources = []
     
-    # Parse resources in this module
-    for resource in root_module.get("resources", []):
-        if resource.get("mode") != "managed":
-            continue
-        
-        res_type = resource.get("type", "")
+    # Explicit stack instead of recursion: deep module trees can't hit the
+    # recursion limit, and every module appends straight into one list
+    stack = [root_module]
+    while stack:
+        module = stack.pop()
         
-        # Skip resources not in our diagram set
-        if res_type not in DIAGRAM_RESOURCES:
-            continue
+        # Parse resources in this module
+        for resource in module.get("resources", ()):
+            if resource.get("mode") != "managed":
+                continue
+            
+            res_type = resource.get("type", "")
+            
+            # Skip resources not in our diagram set
+            if res_type not in DIAGRAM_RESOURCES:
+                continue
+            
+            address = resource.get("address", "")
+            
+            resources.append({
+                "address": address,
+                "type": res_type,
+                "name": resource.get("name", ""),
+                "module": extract_module_name(address),
+                "label": extract_label(resource),
+                "attributes": extract_safe_attributes(resource.get("values", {}))
+            })
         
-        address = resource.get("address", "")
-        
-        resources.append({
-            "address": address,
-            "type": res_type,
-            "name": resource.get("name", ""),
-            "module": extract_module_name(address),
-            "label": extract_label(resource),
-            "attributes": extract_safe_attributes(resource.get("values", {}))
-        })
-    
-    # Recursively parse child modules
-    for child_module in root_module.get("child_modules", []):
-        child_resources = parse_resources(child_module)
-        resources.extend(child_resources)
+        # Child modules next, in order (the stack pops the last one first)
+        stack.extend(reversed(module.get("child_modules", ())))
     
     return resources
 
@@ -261,13 +294,13 @@ def infer_dependencies(resources):
     """Infer logical dependencies based on common architectural patterns."""
     dependencies = []
     
-    # Index resources by type
+    # Index resources by type, and by (type, module) so each pattern only
+    # pairs resources from the same module (or both in root)
     by_type = {}
+    by_type_module = {}
     for r in resources:
-        res_type = r["type"]
-        if res_type not in by_type:
-            by_type[res_type] = []
-        by_type[res_type].append(r)
+        by_type.setdefault(r["type"], []).append(r)
+        by_type_module.setdefault((r["type"], r["module"]), []).append(r)
     
     # Common architectural patterns
     patterns = [
@@ -296,21 +329,16 @@ def infer_dependencies(resources):
     for from_types, to_types in patterns:
         for from_type in from_types:
             for to_type in to_types:
-                from_resources = by_type.get(from_type, [])
-                to_resources = by_type.get(to_type, [])
-                
-                for from_r in from_resources:
-                    for to_r in to_resources:
-                        # Same module or both in root
-                        if from_r["module"] == to_r["module"]:
-                            key = (from_r["address"], to_r["address"])
-                            if key not in seen:
-                                seen.add(key)
-                                dependencies.append({
-                                    "from": from_r["address"],
-                                    "to": to_r["address"],
-                                    "inferred": True
-                                })
+                for from_r in by_type.get(from_type, ()):
+                    for to_r in by_type_module.get((to_type, from_r["module"]), ()):
+                        key = (from_r["address"], to_r["address"])
+                        if key not in seen:
+                            seen.add(key)
+                            dependencies.append({
+                                "from": from_r["address"],
+                                "to": to_r["address"],
+                                "inferred": True
+                            })
     
     return dependencies
 
@@ -364,24 +392,29 @@ def sanitize(data):
 
 
 def main():
-    if len(sys.argv) < 3:
-        print("Usage: python sanitizer.py <input.json> <output.json>")
+    args = sys.argv[1:]
+    compact = "--compact" in args
+    if compact:
+        args.remove("--compact")
+    
+    if len(args) < 2:
+        print("Usage: python sanitizer.py [--compact] <input.json> <output.json>")
         print("       terraform show -json | python sanitizer.py - output.json")
         sys.exit(1)
     
-    input_arg = sys.argv[1]
-    output_arg = sys.argv[2]
+    input_arg = args[0]
+    output_arg = args[1]
     
-    # Read input
+    # Read input as raw bytes; both parsers accept bytes, so a large state
+    # file isn't decoded into a str copy first
     if input_arg == "-":
-        data = json.load(sys.stdin)
+        data = load_json(sys.stdin.buffer.read())
     else:
         input_path = Path(input_arg)
         if not input_path.exists():
             print(f"Error: {input_path} not found", file=sys.stderr)
             sys.exit(1)
-        with open(input_path) as f:
-            data = json.load(f)
+        data = load_json(input_path.read_bytes())
     
     # Sanitize
     try:
@@ -390,9 +423,14 @@ def main():
         print(f"Error: {e}", file=sys.stderr)
         sys.exit(1)
     
-    # Write output
-    with open(output_arg, "w") as f:
-        json.dump(clean, f, indent=2)
+    # Write output (indented by default so committed files diff cleanly).
+    # json.dumps() only uses the C encoder without indent, so the compact
+    # form is encoded in one go rather than streamed through json.dump().
+    with open(output_arg, "w", buffering=1 << 20) as f:
+        if compact:
+            f.write(json.dumps(clean, separators=(",", ":")))
+        else:
+            json.dump(clean, f, indent=2)
     
     # Summary
     meta = clean["_meta"]
@@ -13,9 +13,11 @@ Requirements:
 """
 
 import argparse
+import io
 import json
 import sys
 from collections import defaultdict
+from dataclasses import dataclass
 from pathlib import Path
 from typing import Dict, List, Tuple
 
@@ -357,8 +359,27 @@ RESOURCE_MAP = {
     "aws_cur_report_definition": ("diagrams.aws.cost", "CostAndUsageReport", "cost", False),
 }
 
+
+@dataclass(frozen=True, slots=True)
+class ResourceSpec:
+    """A RESOURCE_MAP entry, with the tuple fields named."""
+    module: str         # diagrams module to import from
+    cls: str            # Node class in that module
+    layer: str
+    requires_vpc: bool
+
+
+# Types with identical entries (e.g. the EC2 variants) share one ResourceSpec
+_SPECS = {spec: ResourceSpec(*spec) for spec in RESOURCE_MAP.values()}
+RESOURCE_MAP = {res_type: _SPECS[spec] for res_type, spec in RESOURCE_MAP.items()}
+
 # Layers for connection inference (flow order)
-LAYER_FLOW = ["edge", "ingress", "compute", "integration", "analytics", "ml", "data", "storage"]
+LAYER_FLOW = ("edge", "ingress", "compute", "integration", "analytics", "ml", "data", "storage")
+LAYER_INDEX = {layer: i for i, layer in enumerate(LAYER_FLOW)}
+
+# VPC resource types drawn in the public / private subnet clusters
+PUBLIC_SUBNET_TYPES = frozenset({"aws_lb", "aws_alb", "aws_elb", "aws_nat_gateway"})
+PRIVATE_SUBNET_TYPES = frozenset({"aws_db_instance", "aws_rds_cluster", "aws_elasticache_cluster"})
 
 
 # =============================================================================
@@ -380,7 +401,19 @@ CLUSTER_ATTRS = {
 }
 
 
-def parse_terraform_json(data: dict) -> Dict[str, dict]:
+@dataclass(slots=True)
+class ResourceInfo:
+    """A supported resource found in the state, with its RESOURCE_MAP fields."""
+    type: str
+    name: str
+    values: dict
+    module: str
+    cls: str
+    layer: str
+    requires_vpc: bool
+
+
+def parse_terraform_json(data: dict) -> Dict[str, ResourceInfo]:
     """Parse terraform show -json output."""
     resources = {}
     
@@ -401,22 +434,18 @@ def parse_terraform_json(data: dict) -> Dict[str, dict]:
             res_name = res.get("name", "")
             res_values = res.get("values", {})
             
-            if res_type not in RESOURCE_MAP:
+            # One lookup both filters unsupported types and fetches the mapping
+            mapping = RESOURCE_MAP.get(res_type)
+            if mapping is None:
                 continue
             
             full_name = f"{prefix}{res_name}" if prefix else res_name
             res_id = f"{res_type}.{full_name}"
-            mapping = RESOURCE_MAP[res_type]
             
-            resources[res_id] = {
-                "type": res_type,
-                "name": full_name,
-                "values": res_values,
-                "module": mapping[0],
-                "class": mapping[1],
-                "layer": mapping[2],
-                "requires_vpc": mapping[3],
-            }
+            resources[res_id] = ResourceInfo(
+                res_type, full_name, res_values,
+                mapping.module, mapping.cls, mapping.layer, mapping.requires_vpc,
+            )
         
         # Process child modules
         for child in module.get("child_modules", []):
@@ -430,45 +459,49 @@ def parse_terraform_json(data: dict) -> Dict[str, dict]:
 
 def infer_connections(resources: dict) -> List[Tuple[str, str]]:
     """Infer connections based on layer flow and resource types."""
-    connections = []
-    seen = set()
-    
-    def add(src, tgt):
-        if src != tgt and src in resources and tgt in resources:
-            if (src, tgt) not in seen:
-                seen.add((src, tgt))
-                connections.append((src, tgt))
-    
     # Group by layer
     by_layer = defaultdict(list)
     for rid, res in resources.items():
-        by_layer[res["layer"]].append(rid)
-    
-    # Connect layers in flow order
-    for i, layer in enumerate(LAYER_FLOW[:-1]):
-        next_layers = LAYER_FLOW[i+1:]
+        by_layer[res.layer].append(rid)
+    
+    # Next layer with resources for each flow position, found in one
+    # right-to-left pass instead of a forward scan per source
+    next_nonempty = [None] * len(LAYER_FLOW)
+    nearest = None
+    for i in range(len(LAYER_FLOW) - 1, -1, -1):
+        next_nonempty[i] = nearest
+        if by_layer[LAYER_FLOW[i]]:
+            nearest = LAYER_FLOW[i]
+    
+    # Connect each layer to the immediate next layer with resources. Every
+    # source sits in one layer and links to one target layer, so these
+    # pairs are already unique
+    connections = []
+    for i, layer in enumerate(LAYER_FLOW):
+        if next_nonempty[i] is None:
+            continue
+        tgts = by_layer[next_nonempty[i]]
         for src in by_layer[layer]:
-            # Connect to next available layer
-            for next_layer in next_layers:
-                if by_layer[next_layer]:
-                    for tgt in by_layer[next_layer]:
-                        add(src, tgt)
-                    break  # Only connect to immediate next layer with resources
-    
-    # Special patterns
+            connections.extend([(src, tgt) for tgt in tgts])
+    
+    # Special patterns. A layer's flow pairs only reach its next non-empty
+    # layer: if that is the pattern's target layer every pair already
+    # exists, otherwise none does, so no per-pair duplicate check is needed
+    next_of = dict(zip(LAYER_FLOW, next_nonempty))
+    
     # CloudFront -> S3 (static content)
-    for rid in by_layer["edge"]:
-        if "cloudfront" in rid.lower():
-            for storage in by_layer["storage"]:
-                if "s3" in storage.lower():
-                    add(rid, storage)
+    if next_of["edge"] != "storage":
+        buckets = [rid for rid in by_layer["storage"] if "s3" in rid.lower()]
+        for rid in by_layer["edge"]:
+            if "cloudfront" in rid.lower():
+                connections.extend([(rid, storage) for storage in buckets])
     
     # Lambda -> DynamoDB (serverless pattern)
-    for compute in by_layer["compute"]:
-        if "lambda" in compute.lower():
-            for data in by_layer["data"]:
-                if "dynamodb" in data.lower():
-                    add(compute, data)
+    if next_of["compute"] != "data":
+        tables = [rid for rid in by_layer["data"] if "dynamodb" in rid.lower()]
+        for compute in by_layer["compute"]:
+            if "lambda" in compute.lower():
+                connections.extend([(compute, data) for data in tables])
     
     return connections
 
@@ -482,100 +515,127 @@ def generate_diagram_code(
 ) -> str:
     """Generate Python code for diagrams library with layout optimizations."""
     
-    # Collect imports
-    imports = {"from diagrams import Diagram, Cluster, Edge"}
-    for res in resources.values():
-        imports.add(f"from {res['module']} import {res['class']}")
+    # Collect imports (the set dedupes; sorting the few unique lines keeps
+    # the generated header stable)
+    imports = {f"from {res.module} import {res.cls}" for res in resources.values()}
+    imports.add("from diagrams import Diagram, Cluster, Edge")
     
     # Check for VPC resources
-    has_vpc = any(res["requires_vpc"] for res in resources.values())
+    has_vpc = any(res.requires_vpc for res in resources.values())
     
-    def var(res_id):
-        return res_id.replace(".", "_").replace("-", "_")
+    # Python identifier for each resource, built once: connection lines
+    # reuse them far more often than there are resources
+    var = {rid: rid.replace(".", "_").replace("-", "_") for rid in resources}
     
     # Sort by layer for logical grouping
     def sort_key(rid):
         res = resources[rid]
-        layer_idx = LAYER_FLOW.index(res["layer"]) if res["layer"] in LAYER_FLOW else 99
-        return (layer_idx, res["name"])
+        return (LAYER_INDEX.get(res.layer, 99), res.name)
     
     sorted_res = sorted(resources.keys(), key=sort_key)
     
     # Build graph attributes string
     graph_attrs = ", ".join(f'"{k}": "{v}"' for k, v in DIAGRAM_ATTRS.items())
     
-    lines = [
-        "#!/usr/bin/env python3",
-        '"""Generated by tf2diagram.py"""',
-        "",
-        *sorted(imports),
-        "",
-        f'graph_attr = {{{graph_attrs}}}',
-        "",
-        f'with Diagram("{title}", show=False, direction="{direction}", outformat="{fmt}", graph_attr=graph_attr):',
-    ]
+    buf = io.StringIO()
+    w = buf.write
+    
+    import_block = "\n".join(sorted(imports))
+    w(f'''#!/usr/bin/env python3
+"""Generated by tf2diagram.py"""
+
+{import_block}
+
+graph_attr = {{{graph_attrs}}}
+
+with Diagram({title!r}, show=False, direction="{direction}", outformat="{fmt}", graph_attr=graph_attr):
+''')
     
     if has_vpc:
-        vpc_res = [r for r in sorted_res if resources[r]["requires_vpc"]]
-        non_vpc = [r for r in sorted_res if not resources[r]["requires_vpc"]]
+        vpc_res, non_vpc = [], []
+        for rid in sorted_res:
+            (vpc_res if resources[rid].requires_vpc else non_vpc).append(rid)
         
         # Non-VPC resources (edge/serverless)
         if non_vpc:
-            lines.append("")
-            lines.append("    # External / Serverless Services")
+            w("\n    # External / Serverless Services\n")
             for rid in non_vpc:
                 res = resources[rid]
-                lines.append(f'    {var(rid)} = {res["class"]}("{res["name"]}")')
+                w(f'    {var[rid]} = {res.cls}({res.name!r})\n')
         
         # VPC resources
         if vpc_res:
-            lines.append("")
-            lines.append('    with Cluster("VPC"):')
+            w('\n    with Cluster("VPC"):\n')
             
             # Group by subnet type if detectable, otherwise just list
-            public_types = {"aws_lb", "aws_alb", "aws_elb", "aws_nat_gateway"}
-            private_types = {"aws_db_instance", "aws_rds_cluster", "aws_elasticache_cluster"}
-            
-            public = [r for r in vpc_res if resources[r]["type"] in public_types]
-            private = [r for r in vpc_res if resources[r]["type"] in private_types]
-            other = [r for r in vpc_res if r not in public and r not in private]
+            public, private, other = [], [], []
+            for rid in vpc_res:
+                res_type = resources[rid].type
+                if res_type in PUBLIC_SUBNET_TYPES:
+                    public.append(rid)
+                elif res_type in PRIVATE_SUBNET_TYPES:
+                    private.append(rid)
+                else:
+                    other.append(rid)
             
             if public:
-                lines.append('        with Cluster("Public Subnet"):')
+                w('        with Cluster("Public Subnet"):\n')
                 for rid in public:
                     res = resources[rid]
-                    lines.append(f'            {var(rid)} = {res["class"]}("{res["name"]}")')
+                    w(f'            {var[rid]} = {res.cls}({res.name!r})\n')
             
             if private:
-                lines.append('        with Cluster("Private Subnet"):')
+                w('        with Cluster("Private Subnet"):\n')
                 for rid in private:
                     res = resources[rid]
-                    lines.append(f'            {var(rid)} = {res["class"]}("{res["name"]}")')
+                    w(f'            {var[rid]} = {res.cls}({res.name!r})\n')
             
             if other:
                 for rid in other:
                     res = resources[rid]
-                    lines.append(f'        {var(rid)} = {res["class"]}("{res["name"]}")')
+                    w(f'        {var[rid]} = {res.cls}({res.name!r})\n')
     else:
         # Pure serverless - group by layer
-        lines.append("")
+        w("\n")
         current_layer = None
         for rid in sorted_res:
             res = resources[rid]
-            if res["layer"] != current_layer:
-                current_layer = res["layer"]
-                lines.append(f"    # {current_layer.title()}")
-            lines.append(f'    {var(rid)} = {res["class"]}("{res["name"]}")')
+            if res.layer != current_layer:
+                current_layer = res.layer
+                w(f'    # {current_layer.title()}\n    {var[rid]} = {res.cls}({res.name!r})\n')
+            else:
+                w(f'    {var[rid]} = {res.cls}({res.name!r})\n')
     
     # Connections
     if connections:
-        lines.append("")
-        lines.append("    # Connections")
+        w("\n    # Connections\n")
         for src, tgt in connections:
-            lines.append(f'    {var(src)} >> {var(tgt)}')
+            w(f'    {var[src]} >> {var[tgt]}\n')
     
-    lines.append("")
-    return "\n".join(lines)
+    return buf.getvalue()
+
+
+# Inputs at least this large are parsed with orjson when it's installed;
+# below that, loading the extension (~6ms) costs more than it saves
+# (load_json is the same in tf2diagram.py, tf2svg.py and sanitizer.py)
+ORJSON_MIN_BYTES = 1 << 20
+
+
+def load_json(raw: bytes):
+    """Parse terraform JSON, with orjson for large inputs when available."""
+    if len(raw) >= ORJSON_MIN_BYTES:
+        try:
+            import orjson
+        except ImportError:
+            pass
+        else:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # orjson is stricter than json (e.g. it rejects NaN/Infinity);
+                # let the stdlib parser have the final say
+                pass
+    return json.loads(raw)
 
 
 def main():
@@ -601,10 +661,9 @@ Examples:
     
     # Read JSON
     if args.input == '-':
-        data = json.load(sys.stdin)
+        data = load_json(sys.stdin.buffer.read())
     else:
-        with open(args.input) as f:
-            data = json.load(f)
+        data = load_json(Path(args.input).read_bytes())
     
     resources = parse_terraform_json(data)
     
@@ -614,8 +673,11 @@ Examples:
         sys.exit(1)
     
     print(f"Found {len(resources)} resources", file=sys.stderr)
+    layer_counts = {}
+    for r in resources.values():
+        layer_counts[r.layer] = layer_counts.get(r.layer, 0) + 1
     for layer in LAYER_FLOW:
-        count = sum(1 for r in resources.values() if r["layer"] == layer)
+        count = layer_counts.get(layer)
         if count:
             print(f"  {layer}: {count}", file=sys.stderr)
     
@@ -627,19 +689,21 @@ Examples:
     if args.output:
         Path(args.output).write_text(code)
         print(f"Wrote {args.output}", file=sys.stderr)
-        if args.run:
-            import subprocess
-            subprocess.run([sys.executable, args.output])
-    elif args.run:
-        import tempfile
-        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-            f.write(code)
-            f.flush()
-            import subprocess
-            subprocess.run([sys.executable, f.name])
-            print(f"Generated: {args.title.lower().replace(' ', '_')}.{args.format}", file=sys.stderr)
-    else:
+    elif not args.run:
         print(code)
+    
+    if args.run:
+        # Imported only here so plain code generation doesn't pay for it
+        import subprocess
+        if args.output:
+            subprocess.run([sys.executable, args.output])
+        else:
+            import tempfile
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
+                f.write(code)
+                f.flush()
+                subprocess.run([sys.executable, f.name])
+                print(f"Generated: {args.title.lower().replace(' ', '_')}.{args.format}", file=sys.stderr)
 
 
 if __name__ == "__main__":
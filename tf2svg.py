@@ -11,7 +11,7 @@ Design Principles Applied:
 
 Usage:
     terraform show -json | python tf2svg.py - output.svg
-    python tf2svg.py tfstate.json output.svg [--title "text"] [--no-user]
+    python tf2svg.py tfstate.json output.svg [--title "text"] [--no-user] [--no-shadow]
 """
 
 import json
@@ -19,7 +19,9 @@ import sys
 import re
 from pathlib import Path
 from collections import defaultdict
-from typing import Optional, List, Tuple, Set, Dict
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional, List, Tuple, Dict, TextIO
 
 # =============================================================================
 # DESIGN SYSTEM (8px grid)
@@ -32,6 +34,8 @@ ICON_SIZE = 48
 NODE_W = 14 * GRID      # 112px
 NODE_H = 13 * GRID      # 104px (increased for better label spacing)
 NODE_RADIUS = GRID
+NODE_W_HALF = NODE_W // 2   # 56px, node centre offsets
+NODE_H_HALF = NODE_H // 2   # 52px
 
 # Spacing
 H_GAP = 5 * GRID        # 40px horizontal gap between nodes
@@ -44,6 +48,12 @@ USER_W = 10 * GRID      # 80px user area width
 # Arrow routing
 ROUTE_MARGIN = 2 * GRID # 16px clearance from nodes
 ROUTE_CHANNEL = 3 * GRID # 24px between parallel arrows
+ROUTE_JOG = H_GAP // 3   # 13px run out of a node before an arrow turns
+ROUTE_DETOUR = 2 * ROUTE_MARGIN # 32px offset of channels above/below a row
+
+# Drop shadows are composited per node by the renderer; above this many
+# nodes they are left out unless explicitly requested
+SHADOW_MAX_NODES = 200
 
 # Colors (AWS palette)
 C = {
@@ -71,7 +81,7 @@ C = {
 # RESOURCE CONFIGURATION
 # =============================================================================
 
-SHOW_RESOURCES = {
+SHOW_RESOURCES = frozenset({
     "aws_lambda_function", "aws_lambda_function_url",
     "aws_instance", "aws_ecs_service", "aws_ecs_cluster", "aws_eks_cluster",
     "aws_db_instance", "aws_rds_cluster", "aws_dynamodb_table",
@@ -83,7 +93,7 @@ SHOW_RESOURCES = {
     "aws_sqs_queue", "aws_sns_topic", "aws_sfn_state_machine",
     "aws_eventbridge_rule", "aws_kinesis_stream",
     "aws_codepipeline", "aws_ecr_repository",
-}
+})
 
 # Tier ordering (left to right flow)
 TIERS = {
@@ -102,14 +112,14 @@ TIERS = {
     "aws_acm_certificate": 6, "aws_cognito_user_pool": 6,
 }
 
-ENTRY_POINTS = {
+ENTRY_POINTS = frozenset({
     "aws_route53_zone",
     # "aws_cloudfront_distribution",  # Users enter via DNS, not direct
     "aws_api_gateway_rest_api",
     "aws_apigatewayv2_api",
     "aws_lb", "aws_alb",
     "aws_lambda_function_url",  # Direct function URL access
-}
+})
 
 # Dependency patterns for arrow inference
 # Note: Route53 -> CloudFront is NOT included because DNS resolution
@@ -131,6 +141,11 @@ DEP_PATTERNS = [
     ("aws_sqs_queue", "aws_lambda_function"),
 ]
 
+# DEP_PATTERNS grouped by source type: src -> (tgt, ...), in pattern order
+DEP_BY_SRC: Dict[str, Tuple[str, ...]] = {
+    src: tuple(tgt for s, tgt in DEP_PATTERNS if s == src) for src, _ in DEP_PATTERNS
+}
+
 SERVICE_LABELS = {
     "aws_lambda_function": "Lambda",
     "aws_lambda_function_url": "Lambda URL",
@@ -153,6 +168,24 @@ SERVICE_LABELS = {
     "aws_elasticache_cluster": "ElastiCache",
 }
 
+# Short text drawn on each node's icon tile (other types use their first 3 letters)
+SERVICE_ABBREVS = {
+    "aws_lambda_function": "λ",
+    "aws_lambda_function_url": "λ",
+    "aws_dynamodb_table": "DDB",
+    "aws_s3_bucket": "S3",
+    "aws_cloudfront_distribution": "CF",
+    "aws_route53_zone": "R53",
+    "aws_wafv2_web_acl": "WAF",
+    "aws_acm_certificate": "ACM",
+    "aws_api_gateway_rest_api": "API",
+    "aws_lb": "ALB",
+    "aws_sqs_queue": "SQS",
+    "aws_sns_topic": "SNS",
+    "aws_ecs_service": "ECS",
+    "aws_instance": "EC2",
+}
+
 
 # =============================================================================
 # GRID-BASED ROUTING SYSTEM
@@ -169,11 +202,15 @@ class RoutingGrid:
         self.cell = cell_size
         self.cols = width // cell_size + 1
         self.rows = height // cell_size + 1
-        # Blocked cells (occupied by nodes)
-        self.blocked: Set[Tuple[int, int]] = set()
-        # Track used routing channels to avoid overlapping arrows
-        self.used_h: Dict[int, Set[int]] = defaultdict(set)  # y -> set of x ranges
-        self.used_v: Dict[int, Set[int]] = defaultdict(set)  # x -> set of y ranges
+        # Blocked cells (occupied by nodes), one bytearray per grid row:
+        # blocked[gy][gx] is 1 when the cell is taken
+        self.blocked: List[bytearray] = [bytearray(self.cols) for _ in range(self.rows)]
+        # Column-major copy (blocked_t[gx][gy]) so vertical scans are one find()
+        self.blocked_t: List[bytearray] = [bytearray(self.rows) for _ in range(self.cols)]
+        # Rows / columns holding any blocked cell; most arrows run along
+        # empty rows and are cleared by a single lookup here
+        self.row_any = bytearray(self.rows)
+        self.col_any = bytearray(self.cols)
     
     def to_grid(self, x: int, y: int) -> Tuple[int, int]:
         return x // self.cell, y // self.cell
@@ -182,39 +219,69 @@ class RoutingGrid:
         """Mark rectangle as blocked with margin."""
         gx1, gy1 = self.to_grid(x - margin, y - margin)
         gx2, gy2 = self.to_grid(x + w + margin, y + h + margin)
-        for gx in range(max(0, gx1), min(self.cols, gx2 + 1)):
-            for gy in range(max(0, gy1), min(self.rows, gy2 + 1)):
-                self.blocked.add((gx, gy))
+        gx1, gx2 = max(0, gx1), min(self.cols, gx2 + 1)
+        gy1, gy2 = max(0, gy1), min(self.rows, gy2 + 1)
+        # Slices with a negative end would wrap around, so bail out early
+        if gx1 >= gx2 or gy1 >= gy2:
+            return
+        # One slice store per row (and column) instead of one set insert per cell
+        fill = b"\x01" * (gx2 - gx1)
+        for row in self.blocked[gy1:gy2]:
+            row[gx1:gx2] = fill
+        self.col_any[gx1:gx2] = fill
+        fill = b"\x01" * (gy2 - gy1)
+        for col in self.blocked_t[gx1:gx2]:
+            col[gy1:gy2] = fill
+        self.row_any[gy1:gy2] = fill
+    
+    def row_clear(self, gy: int, gx1: int, gx2: int) -> bool:
+        """Check if grid row gy has no blocked cell from gx1 to gx2 (inclusive)."""
+        if not 0 <= gy < self.rows or gx2 < 0 or not self.row_any[gy]:
+            return True
+        return self.blocked[gy].find(1, max(0, gx1), gx2 + 1) < 0
+    
+    def col_clear(self, gx: int, gy1: int, gy2: int) -> bool:
+        """Check if grid column gx has no blocked cell from gy1 to gy2 (inclusive)."""
+        if not 0 <= gx < self.cols or gy2 < 0 or not self.col_any[gx]:
+            return True
+        return self.blocked_t[gx].find(1, max(0, gy1), gy2 + 1) < 0
     
     def is_clear_h(self, y: int, x1: int, x2: int) -> bool:
         """Check if horizontal path at y from x1 to x2 is clear."""
-        gy = y // self.cell
-        xmin, xmax = min(x1, x2), max(x1, x2)
-        for gx in range(xmin // self.cell, xmax // self.cell + 1):
-            if (gx, gy) in self.blocked:
-                return False
-            # Also check row above and below for margin
-            if (gx, gy - 1) in self.blocked or (gx, gy + 1) in self.blocked:
-                return False
-        return True
+        cell = self.cell
+        gy = y // cell
+        gx1, gx2 = min(x1, x2) // cell, max(x1, x2) // cell
+        # Also check row above and below for margin
+        return (self.row_clear(gy, gx1, gx2) and
+                self.row_clear(gy - 1, gx1, gx2) and
+                self.row_clear(gy + 1, gx1, gx2))
     
     def is_clear_v(self, x: int, y1: int, y2: int) -> bool:
         """Check if vertical path is clear."""
-        gx = x // self.cell
-        ymin, ymax = min(y1, y2), max(y1, y2)
-        for gy in range(ymin // self.cell, ymax // self.cell + 1):
-            if (gx, gy) in self.blocked:
-                return False
-        return True
+        cell = self.cell
+        return self.col_clear(x // cell, min(y1, y2) // cell, max(y1, y2) // cell)
     
     def find_h_channel(self, y1: int, y2: int, x1: int, x2: int) -> int:
         """Find clear horizontal routing channel between y1 and y2."""
         ymin, ymax = min(y1, y2), max(y1, y2)
+        cell = self.cell
+        gx1, gx2 = min(x1, x2) // cell, max(x1, x2) // cell
+        # Candidates step by GRID, so several share a grid row; scan each
+        # row once and test a candidate against its row and both neighbours
+        row_clear = {}
+        
+        def clear(gy):
+            if gy not in row_clear:
+                row_clear[gy] = self.row_clear(gy, gx1, gx2)
+            return row_clear[gy]
+        
+        lo, hi = ymin - GRID * 2, ymax + GRID * 2
         # Try positions between the two y values
         for offset in range(0, (ymax - ymin) // 2 + GRID * 8, GRID):
-            for y in [ymin + offset, ymax - offset]:
-                if ymin - GRID * 2 <= y <= ymax + GRID * 2:
-                    if self.is_clear_h(y, x1, x2):
+            for y in (ymin + offset, ymax - offset):
+                if lo <= y <= hi:
+                    gy = y // cell
+                    if clear(gy) and clear(gy - 1) and clear(gy + 1):
                         return y
         return (y1 + y2) // 2  # Fallback
     
@@ -232,14 +299,10 @@ class RoutingGrid:
                 return points
         
         # Check if there are obstacles between source and target
-        has_obstacle = False
-        for gx in range(x1 // self.cell, x2 // self.cell + 1):
-            gy = y1 // self.cell
-            if (gx, gy) in self.blocked:
-                # Check if this isn't our source/target node
-                if gx > (x1 + NODE_W) // self.cell and gx < (x2 - NODE_W) // self.cell:
-                    has_obstacle = True
-                    break
+        # (cells within NODE_W of either end belong to our source/target node)
+        cell = self.cell
+        has_obstacle = not self.row_clear(
+            y1 // cell, (x1 + NODE_W) // cell + 1, (x2 - NODE_W) // cell - 1)
         
         if not has_obstacle and abs(y1 - y2) <= GRID:
             # Direct horizontal if no obstacle
@@ -247,7 +310,7 @@ class RoutingGrid:
             return points
         
         # Need orthogonal routing
-        mid_x1 = x1 + H_GAP // 3
+        mid_x1 = x1 + ROUTE_JOG
         
         # Check if simple L-route works
         if self.is_clear_v(mid_x1, y1, y2) and not has_obstacle:
@@ -257,8 +320,8 @@ class RoutingGrid:
         else:
             # Route above or below the obstacles
             # Find a clear horizontal channel
-            y_above = min(y1, y2) - ROUTE_MARGIN * 2
-            y_below = max(y1, y2) + ROUTE_MARGIN * 2
+            y_above = min(y1, y2) - ROUTE_DETOUR
+            y_below = max(y1, y2) + ROUTE_DETOUR
             
             # Try routing above first (cleaner visually)
             if y_above > 0 and self.is_clear_h(y_above, x1, x2):
@@ -269,7 +332,7 @@ class RoutingGrid:
                 # Find any clear channel
                 channel_y = self.find_h_channel(y1, y2, x1, x2)
             
-            mid_x2 = x2 - H_GAP // 3
+            mid_x2 = x2 - ROUTE_JOG
             
             points.append((mid_x1, y1))
             points.append((mid_x1, channel_y))
@@ -280,18 +343,23 @@ class RoutingGrid:
         return self._simplify(points)
     
     def _simplify(self, points: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
-        """Remove redundant waypoints."""
+        """Remove redundant waypoints: repeats and points on a straight run."""
         if len(points) <= 2:
             return points
         result = [points[0]]
-        for i in range(1, len(points) - 1):
-            p0, p1, p2 = points[i-1], points[i], points[i+1]
-            # Keep point if direction changes
-            dx1, dy1 = p1[0] - p0[0], p1[1] - p0[1]
-            dx2, dy2 = p2[0] - p1[0], p2[1] - p1[1]
-            if (dx1 == 0) != (dx2 == 0) or (dy1 == 0) != (dy2 == 0):
-                result.append(p1)
-        result.append(points[-1])
+        for p in points[1:]:
+            if p == result[-1]:
+                continue  # zero-length segment
+            if len(result) >= 2:
+                (ax, ay), (bx, by) = result[-2], result[-1]
+                # Keep the last point only if the path turns (or doubles back) there
+                if ((ax == bx == p[0] and (by - ay) * (p[1] - by) > 0) or
+                        (ay == by == p[1] and (bx - ax) * (p[0] - bx) > 0)):
+                    result[-1] = p
+                    continue
+            result.append(p)
+        if len(result) < 2:
+            return [points[0], points[-1]]
         return result
 
 
@@ -299,6 +367,29 @@ class RoutingGrid:
 # TERRAFORM STATE PARSING
 # =============================================================================
 
+# Inputs at least this large are parsed with orjson when it's installed;
+# below that, loading the extension (~6ms) costs more than it saves
+# (load_json is the same in tf2diagram.py, tf2svg.py and sanitizer.py)
+ORJSON_MIN_BYTES = 1 << 20
+
+
+def load_json(raw: bytes):
+    """Parse terraform JSON, with orjson for large inputs when available."""
+    if len(raw) >= ORJSON_MIN_BYTES:
+        try:
+            import orjson
+        except ImportError:
+            pass
+        else:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # orjson is stricter than json (e.g. it rejects NaN/Infinity);
+                # let the stdlib parser have the final say
+                pass
+    return json.loads(raw)
+
+
 def parse_state(data: dict) -> dict:
     """Parse terraform show -json output."""
     resources = []
@@ -342,20 +433,25 @@ def parse_state(data: dict) -> dict:
     
     # Infer dependencies
     deps = []
-    by_mod_type = defaultdict(list)
+    by_mod_type = {}
+    by_type = defaultdict(list)  # type -> [(module, resources), ...]
     for r in resources:
-        by_mod_type[(r.get("module"), r["type"])].append(r)
-    
-    for src_type, tgt_type in DEP_PATTERNS:
-        for (mod, rtype), srcs in by_mod_type.items():
-            if rtype != src_type:
-                continue
-            tgts = by_mod_type.get((mod, tgt_type), [])
-            if not tgts and mod:
-                tgts = by_mod_type.get((None, tgt_type), [])
-            for s in srcs:
-                for t in tgts:
-                    deps.append({"from": s["address"], "to": t["address"]})
+        key = (r.get("module"), r["type"])
+        group = by_mod_type.get(key)
+        if group is None:
+            group = by_mod_type[key] = []
+            by_type[r["type"]].append((key[0], group))
+        group.append(r)
+    
+    for src_type, tgt_types in DEP_BY_SRC.items():
+        groups = by_type.get(src_type)
+        if not groups:
+            continue
+        for tgt_type in tgt_types:
+            for mod, srcs in groups:
+                # Fall back to root-module targets when the module has none
+                tgts = by_mod_type.get((mod, tgt_type)) or by_mod_type.get((None, tgt_type), ())
+                deps.extend({"from": s["address"], "to": t["address"]} for s in srcs for t in tgts)
     
     modules = list(set(r["module"] for r in resources if r["module"]))
     return {"resources": resources, "dependencies": deps, "modules": modules}
@@ -365,6 +461,51 @@ def parse_state(data: dict) -> dict:
 # LAYOUT ENGINE
 # =============================================================================
 
+@dataclass(slots=True)
+class NodePos:
+    """A placed node: top-left corner and its resource.
+
+    Every node is NODE_W x NODE_H, so the centre and edges are derived on
+    access instead of being stored per node.
+    """
+    x: int
+    y: int
+    res: dict
+    
+    @property
+    def cx(self) -> int:
+        return self.x + NODE_W_HALF
+    
+    @property
+    def cy(self) -> int:
+        return self.y + NODE_H_HALF
+    
+    @property
+    def l(self) -> int:
+        return self.x
+    
+    @property
+    def r(self) -> int:
+        return self.x + NODE_W
+    
+    @property
+    def t(self) -> int:
+        return self.y
+    
+    @property
+    def b(self) -> int:
+        return self.y + NODE_H
+
+
+@dataclass(slots=True)
+class ModuleBounds:
+    x: int
+    y: int
+    w: int
+    h: int
+    label: str
+
+
 def layout(data: dict, title: str = None) -> dict:
     """Calculate positions for all elements using grid system."""
     resources = [r for r in data.get("resources", []) if r["type"] in SHOW_RESOURCES]
@@ -375,8 +516,9 @@ def layout(data: dict, title: str = None) -> dict:
         by_mod[r.get("module") or "_root"].append(r)
     
     # Sort by tier within modules
-    for mod in by_mod:
-        by_mod[mod].sort(key=lambda r: (TIERS.get(r["type"], 4), r["name"]))
+    tier = TIERS.get
+    for mod_res in by_mod.values():
+        mod_res.sort(key=lambda r: (tier(r["type"], 4), r["name"]))
     
     # Module order
     mod_order = []
@@ -401,24 +543,17 @@ def layout(data: dict, title: str = None) -> dict:
         mod_h = NODE_H + MODULE_PAD * 2 + MODULE_HDR
         mod_x = CANVAS_PAD + USER_W
         
-        mod_bounds[mod_name] = {
-            "x": mod_x, "y": y, "w": mod_w, "h": mod_h,
-            "label": mod_name.replace("_", " ").title() if mod_name != "_root" else "Root"
-        }
+        mod_bounds[mod_name] = ModuleBounds(
+            mod_x, y, mod_w, mod_h,
+            mod_name.replace("_", " ").title() if mod_name != "_root" else "Root",
+        )
         
         # Position nodes
         nx = mod_x + MODULE_PAD
         ny = y + MODULE_HDR + MODULE_PAD
         
         for r in mod_res:
-            positions[r["address"]] = {
-                "x": nx, "y": ny,
-                "cx": nx + NODE_W // 2,
-                "cy": ny + NODE_H // 2,
-                "l": nx, "r": nx + NODE_W,
-                "t": ny, "b": ny + NODE_H,
-                "res": r,
-            }
+            positions[r["address"]] = NodePos(nx, ny, r)
             nx += NODE_W + H_GAP
         
         max_w = max(max_w, mod_x + mod_w)
@@ -442,14 +577,19 @@ def layout(data: dict, title: str = None) -> dict:
 # =============================================================================
 
 def esc(s: str) -> str:
-    return str(s).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+    s = s if type(s) is str else str(s)
+    if "&" not in s and "<" not in s and ">" not in s:
+        return s
+    return s.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
 
 
 def trunc(s: str, n: int = 12) -> str:
     return s if len(s) <= n else s[:n-1] + "…"
 
 
+@lru_cache(maxsize=None)
 def get_color(rtype: str) -> str:
+    # Cached per type: the substring checks run once for each distinct type
     rt = rtype.lower()
     if "lambda" in rt or "ec2" in rt or "ecs" in rt or "eks" in rt:
         return C["compute"]
@@ -467,159 +607,175 @@ def get_color(rtype: str) -> str:
 
 
 def get_abbrev(rtype: str) -> str:
-    abbrevs = {
-        "aws_lambda_function": "λ",
-        "aws_lambda_function_url": "λ",
-        "aws_dynamodb_table": "DDB",
-        "aws_s3_bucket": "S3",
-        "aws_cloudfront_distribution": "CF",
-        "aws_route53_zone": "R53",
-        "aws_wafv2_web_acl": "WAF",
-        "aws_acm_certificate": "ACM",
-        "aws_api_gateway_rest_api": "API",
-        "aws_lb": "ALB",
-        "aws_sqs_queue": "SQS",
-        "aws_sns_topic": "SNS",
-        "aws_ecs_service": "ECS",
-        "aws_instance": "EC2",
-    }
-    return abbrevs.get(rtype, rtype.replace("aws_", "")[:3].upper())
+    return SERVICE_ABBREVS.get(rtype) or rtype.replace("aws_", "")[:3].upper()
+
 
+@lru_cache(maxsize=None)
+def node_style(rtype: str) -> Tuple[str, str, str]:
+    """(color, abbrev, escaped service label) for a node of this type (cached per type)."""
+    return get_color(rtype), get_abbrev(rtype), esc(SERVICE_LABELS.get(rtype, ""))
 
-def svg_defs() -> str:
-    return f'''  <defs>
+
+# Markers, filter and the user figure never change, so build them once
+SVG_MARKERS = f'''  <defs>
     <marker id="arr" markerWidth="8" markerHeight="6" refX="7" refY="3" orient="auto">
       <path d="M0,0 L0,6 L8,3 z" fill="{C['arrow']}"/>
     </marker>
-    <filter id="drop" x="-10%" y="-10%" width="120%" height="130%">
+'''
+
+SVG_SHADOW_FILTER = '''    <filter id="drop" x="-10%" y="-10%" width="120%" height="130%">
       <feDropShadow dx="0" dy="1" stdDeviation="2" flood-opacity="0.1"/>
     </filter>
-  </defs>'''
+'''
+
+SVG_DEFS = SVG_MARKERS + SVG_SHADOW_FILTER + '  </defs>\n'
+SVG_DEFS_FLAT = SVG_MARKERS + '  </defs>\n'
+
+SVG_USER_BODY = f'''    <circle cx="24" cy="12" r="9" fill="none" stroke="{C['user']}" stroke-width="2"/>
+    <path d="M8,38 Q8,24 24,24 Q40,24 40,38" fill="none" stroke="{C['user']}" stroke-width="2"/>
+    <text x="24" y="54" font-size="11" fill="{C["text"]}" text-anchor="middle">Users</text>
+  </g>
+'''
+
 
+def svg_defs(parts: List[str], shadow: bool = True) -> None:
+    parts.append(SVG_DEFS if shadow else SVG_DEFS_FLAT)
 
-def svg_module(b: dict) -> str:
-    x, y, w, h = b["x"], b["y"], b["w"], b["h"]
-    return f'''  <g class="module">
-    <rect x="{x}" y="{y}" width="{w}" height="{h}" fill="{C['module_bg']}" stroke="{C['module_border']}" rx="8"/>
-    <path d="M{x+8},{y} h{w-16} a8,8 0 0 1 8,8 v{MODULE_HDR-8} h-{w} v-{MODULE_HDR-8} a8,8 0 0 1 8,-8 z" fill="{C['module_hdr']}"/>
-    <text x="{x+16}" y="{y+22}" font-size="13" font-weight="600" fill="{C['text_inv']}">{esc(b['label'])}</text>
-  </g>'''
 
+def svg_module(parts: List[str], b: ModuleBounds) -> None:
+    x, y, w, h = b.x, b.y, b.w, b.h
+    parts.append(f'''  <g class="module">
+    <rect x="{x}" y="{y}" width="{w}" height="{h}" fill="{C["module_bg"]}" stroke="{C["module_border"]}" rx="8"/>
+    <path d="M{x+8},{y} h{w-16} a8,8 0 0 1 8,8 v{MODULE_HDR-8} h-{w} v-{MODULE_HDR-8} a8,8 0 0 1 8,-8 z" fill="{C["module_hdr"]}"/>
+    <text x="{x+16}" y="{y+22}" font-size="13" font-weight="600" fill="{C["text_inv"]}">{esc(b.label)}</text>
+  </g>
+''')
 
-def svg_node(p: dict) -> str:
-    x, y = p["x"], p["y"]
-    r = p["res"]
-    rtype = r["type"]
-    color = get_color(rtype)
-    abbrev = get_abbrev(rtype)
-    svc = SERVICE_LABELS.get(rtype, "")
+
+def svg_node(parts: List[str], p: NodePos, shadow: bool = True) -> None:
+    x, y = p.x, p.y
+    r = p.res
+    color, abbrev, svc = node_style(r["type"])
     label = trunc(r.get("label", r["name"]))
     
     icon_x = x + (NODE_W - ICON_SIZE) // 2
     icon_y = y + 12
+    flt = ' filter="url(#drop)"' if shadow else ''
     
-    return f'''  <g class="node">
-    <rect x="{x}" y="{y}" width="{NODE_W}" height="{NODE_H}" fill="{C['node_bg']}" stroke="{C['node_border']}" rx="6" filter="url(#drop)"/>
+    parts.append(f'''  <g class="node">
+    <rect x="{x}" y="{y}" width="{NODE_W}" height="{NODE_H}" fill="{C["node_bg"]}" stroke="{C["node_border"]}" rx="6"{flt}/>
     <rect x="{icon_x}" y="{icon_y}" width="{ICON_SIZE}" height="{ICON_SIZE}" rx="6" fill="{color}"/>
     <text x="{icon_x + ICON_SIZE//2}" y="{icon_y + 32}" font-size="16" font-weight="600" fill="white" text-anchor="middle">{abbrev}</text>
-    <text x="{x + NODE_W//2}" y="{y + NODE_H - 24}" font-size="9" fill="{C['text2']}" text-anchor="middle">{esc(svc)}</text>
-    <text x="{x + NODE_W//2}" y="{y + NODE_H - 10}" font-size="11" fill="{C['text']}" text-anchor="middle">{esc(label)}</text>
-  </g>'''
+    <text x="{x + NODE_W_HALF}" y="{y + NODE_H - 24}" font-size="9" fill="{C["text2"]}" text-anchor="middle">{svc}</text>
+    <text x="{x + NODE_W_HALF}" y="{y + NODE_H - 10}" font-size="11" fill="{C["text"]}" text-anchor="middle">{esc(label)}</text>
+  </g>
+''')
 
 
-def svg_path(points: List[Tuple[int, int]]) -> str:
+def svg_path(parts: List[str], points: List[Tuple[int, int]]) -> None:
     if len(points) < 2:
-        return ""
-    d = f"M{points[0][0]},{points[0][1]}"
-    for px, py in points[1:]:
-        d += f" L{px},{py}"
-    return f'  <path d="{d}" fill="none" stroke="{C["arrow"]}" stroke-width="1.5" marker-end="url(#arr)"/>'
+        return
+    (x0, y0), *rest = points
+    d = " ".join([f"M{x0},{y0}"] + [f"L{px},{py}" for px, py in rest])
+    parts.append(f'  <path d="{d}" fill="none" stroke="{C["arrow"]}" stroke-width="1.5" marker-end="url(#arr)"/>\n')
 
 
-def svg_user(ux: int, uy: int) -> str:
-    return f'''  <g class="user" transform="translate({ux},{uy})">
-    <circle cx="24" cy="12" r="9" fill="none" stroke="{C['user']}" stroke-width="2"/>
-    <path d="M8,38 Q8,24 24,24 Q40,24 40,38" fill="none" stroke="{C['user']}" stroke-width="2"/>
-    <text x="24" y="54" font-size="11" fill="{C['text']}" text-anchor="middle">Users</text>
-  </g>'''
+def svg_user(parts: List[str], ux: int, uy: int) -> None:
+    parts.append(f'  <g class="user" transform="translate({ux},{uy})">\n')
+    parts.append(SVG_USER_BODY)
+
 
+def generate_svg(data: dict, title: str = None, show_user: bool = True,
+                 out: Optional[TextIO] = None,
+                 shadow: Optional[bool] = None) -> Optional[str]:
+    """Generate the SVG document.
 
-def generate_svg(data: dict, title: str = None, show_user: bool = True) -> str:
+    Every svg_* helper appends newline-terminated fragments to one list.
+    The list is written to `out` when given (and None returned), otherwise
+    joined and returned. Node drop shadows default to on for diagrams of
+    up to SHADOW_MAX_NODES nodes; pass `shadow` to force either way.
+    """
     data = parse_state(data)
     L = layout(data, title)
     
     pos = L["pos"]
     w, h = int(L["w"]), int(L["h"])
+    if shadow is None:
+        shadow = len(pos) <= SHADOW_MAX_NODES
     
     # Initialize routing grid
     grid = RoutingGrid(w, h)
     
     # Block all node areas
     for p in pos.values():
-        grid.block_rect(p["x"], p["y"], NODE_W, NODE_H)
+        grid.block_rect(p.x, p.y, NODE_W, NODE_H)
     
     # Block module headers
     for b in L["mods"].values():
-        grid.block_rect(b["x"], b["y"], b["w"], MODULE_HDR)
+        grid.block_rect(b.x, b.y, b.w, MODULE_HDR)
     
-    parts = [
-        f'<?xml version="1.0" encoding="UTF-8"?>',
-        f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}" style="font-family: -apple-system, BlinkMacSystemFont, \'Segoe UI\', Roboto, sans-serif;">',
-        svg_defs(),
-        f'  <rect width="100%" height="100%" fill="{C["bg"]}"/>',
-    ]
+    parts: List[str] = []
+    append = parts.append
+    append('<?xml version="1.0" encoding="UTF-8"?>\n')
+    append(f'<svg xmlns="http://www.w3.org/2000/svg" width="{w}" height="{h}" viewBox="0 0 {w} {h}" style="font-family: -apple-system, BlinkMacSystemFont, \'Segoe UI\', Roboto, sans-serif;">\n')
+    svg_defs(parts, shadow)
+    append(f'  <rect width="100%" height="100%" fill="{C["bg"]}"/>\n')
     
     # Title
     if title:
-        parts.append(f'  <text x="{CANVAS_PAD}" y="{L["title_y"]}" font-size="18" font-weight="600" fill="{C["text"]}">{esc(title)}</text>')
+        append(f'  <text x="{CANVAS_PAD}" y="{L["title_y"]}" font-size="18" font-weight="600" fill="{C["text"]}">{esc(title)}</text>\n')
     
     # Modules (background layer)
     for b in L["mods"].values():
-        parts.append(svg_module(b))
+        svg_module(parts, b)
     
     # Nodes
     for p in pos.values():
-        parts.append(svg_node(p))
+        svg_node(parts, p, shadow)
     
     # Dependency arrows - using grid routing
     for dep in data.get("dependencies", []):
         fp, tp = pos.get(dep["from"]), pos.get(dep["to"])
         if fp and tp:
-            x1, y1 = fp["r"] + 4, fp["cy"]
-            x2, y2 = tp["l"] - 4, tp["cy"]
+            x1, y1 = fp.r + 4, fp.cy
+            x2, y2 = tp.l - 4, tp.cy
             
             # Use grid routing
             waypoints = grid.route(x1, y1, x2, y2)
-            parts.append(svg_path(waypoints))
+            svg_path(parts, waypoints)
     
     # User and entry point arrows
     if show_user and pos:
         ux, uy = L["user"]["x"], L["user"]["y"]
-        parts.append(svg_user(ux, uy))
+        svg_user(parts, ux, uy)
         
         user_out_x = ux + 48
         user_out_y = uy + 24
+        mid_x = user_out_x + 20
         
         # Find entry points
-        entries = [(addr, p) for addr, p in pos.items() if p["res"]["type"] in ENTRY_POINTS]
+        entries = [p for p in pos.values() if p.res["type"] in ENTRY_POINTS]
+        half = len(entries) // 2
         
-        for i, (addr, ep) in enumerate(entries):
-            ex, ey = ep["l"] - 4, ep["cy"]
+        for i, ep in enumerate(entries):
+            ex, ey = ep.l - 4, ep.cy
             
             # Stagger multiple arrows
-            offset = (i - len(entries) // 2) * 8
+            offset = (i - half) * 8
             
             if abs(user_out_y - ey) < GRID * 2:
                 # Same level - direct line
-                parts.append(f'  <line x1="{user_out_x}" y1="{user_out_y}" x2="{ex}" y2="{ey}" stroke="{C["arrow"]}" stroke-width="1.5" marker-end="url(#arr)"/>')
+                append(f'  <line x1="{user_out_x}" y1="{user_out_y}" x2="{ex}" y2="{ey}" stroke="{C["arrow"]}" stroke-width="1.5" marker-end="url(#arr)"/>\n')
             else:
                 # Curved path to avoid overlaps
-                mid_x = user_out_x + 20
                 start_y = user_out_y + offset
-                parts.append(f'  <path d="M{user_out_x},{start_y} L{mid_x},{start_y} Q{mid_x},{ey},{ex},{ey}" fill="none" stroke="{C["arrow"]}" stroke-width="1.5" marker-end="url(#arr)"/>')
+                append(f'  <path d="M{user_out_x},{start_y} L{mid_x},{start_y} Q{mid_x},{ey},{ex},{ey}" fill="none" stroke="{C["arrow"]}" stroke-width="1.5" marker-end="url(#arr)"/>\n')
     
-    parts.append('</svg>')
-    return '\n'.join(parts)
+    append('</svg>')
+    if out is None:
+        return ''.join(parts)
+    out.writelines(parts)
+    return None
 
 
 # =============================================================================
@@ -629,13 +785,14 @@ def generate_svg(data: dict, title: str = None, show_user: bool = True) -> str:
 def main():
     if len(sys.argv) < 3:
         print("Usage: terraform show -json | python tf2svg.py - output.svg", file=sys.stderr)
-        print("       python tf2svg.py state.json output.svg [--title \"text\"] [--no-user]", file=sys.stderr)
+        print("       python tf2svg.py state.json output.svg [--title \"text\"] [--no-user] [--no-shadow]", file=sys.stderr)
         sys.exit(1)
     
     inp = sys.argv[1]
     out = Path(sys.argv[2])
     
     show_user = "--no-user" not in sys.argv
+    shadow = False if "--no-shadow" in sys.argv else None
     title = None
     if "--title" in sys.argv:
         i = sys.argv.index("--title")
@@ -643,19 +800,21 @@ def main():
             title = sys.argv[i + 1]
     
     if inp == "-":
-        data = json.load(sys.stdin)
+        data = load_json(sys.stdin.buffer.read())
     else:
         p = Path(inp)
         if not p.exists():
             print(f"Error: {inp} not found", file=sys.stderr)
             sys.exit(1)
-        data = json.loads(p.read_text())
+        data = load_json(p.read_bytes())
     
-    svg = generate_svg(data, title, show_user)
-    out.write_text(svg)
+    # Parse once; generate_svg passes already-parsed data straight through
+    parsed = parse_state(data)
+    # Render fully before touching the output so a failure can't truncate it
+    svg = generate_svg(parsed, title, show_user, shadow=shadow)
+    out.write_text(svg, encoding='utf-8')
     
     # Stats
-    parsed = parse_state(data)
     res = [r for r in parsed.get("resources", []) if r["type"] in SHOW_RESOURCES]
     mods = set(r.get("module") or "_root" for r in res)
     print(f"✓ {out}", file=sys.stderr)